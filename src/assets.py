@@ -0,0 +1,98 @@
+import hashlib
+import os
+import struct
+import zipfile
+from pathlib import Path
+import numpy as np
+from atomic import atomic_write
+from pcm import CHANNELS, decode, map_wav
+
+# Decoded/derived per-file assets live in one cache dir. File names are "<path hash>-<state hash>.<kind>",
+# the state hash covers size + mtime, so an edited source gets a new entry and evict() drops the old one.
+MAX_BYTES = 4 * 1024 ** 3
+# What reading a truncated or corrupt entry raises (np.load, json, PIL)
+LOAD_ERRORS = (OSError, ValueError, EOFError, KeyError, zipfile.BadZipFile)
+
+
+class AssetCache:
+    def __init__(self, root, max_bytes=MAX_BYTES):
+        self.root = Path(root); self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def key(self, src):
+        src = Path(src).resolve(); st = src.stat()
+        ph = hashlib.sha1(str(src).encode("utf-8")).hexdigest()[:16]
+        sh = hashlib.sha1(f"{st.st_size}:{st.st_mtime_ns}".encode()).hexdigest()[:8]
+        return ph, sh
+
+    def path_for(self, src, kind):
+        ph, sh = self.key(src)
+        return self.root / f"{ph}-{sh}.{kind}"
+
+    def touch(self, p):
+        try: os.utime(p)
+        except OSError: pass
+
+    def save(self, p, writer): atomic_write(p, writer); self.evict()
+
+    def cached(self, src, kind, load, build, save):
+        # The kind entry of src: load(path) when it is there, else build() and save(obj, f) it. An unreadable entry is
+        # reported and dropped, so it is rebuilt once instead of on every load
+        p = self.path_for(src, kind)
+        if p.exists():
+            try: self.touch(p); return load(p)
+            except LOAD_ERRORS as e: print(f"❌ Cache entry unreadable, rebuilding: {p.name} ({e})"); p.unlink(missing_ok=True)
+        obj = build(); self.save(p, lambda f: save(obj, f))
+        return obj
+
+    def write(self, p, data): self.save(p, lambda f: f.write(memoryview(np.ascontiguousarray(data)).cast("B")))
+
+    def native(self, src):
+        # Stems written by the separator as 16-bit 44.1 kHz WAV are mapped where they are, no cache copy
+        if Path(src).suffix.lower() != ".wav": return None
+        try: return map_wav(src)
+        except (OSError, struct.error, ValueError): return None
+
+    def has_pcm(self, src): return self.native(src) is not None or self.path_for(src, "pcm").exists()
+
+    def load_pcm(self, src):
+        data = self.native(src)
+        if data is not None: return data
+        p = self.path_for(src, "pcm")
+        if not p.exists(): self.write(p, decode(src))
+        self.touch(p)
+        if p.stat().st_size == 0: return np.zeros((0, CHANNELS), dtype=np.int16)
+        return np.memmap(p, dtype=np.int16, mode="r").reshape(-1, CHANNELS)
+
+    def entries(self):
+        # (mtime, size, path) of every entry, one stat each; other processes evict concurrently, so an entry that is
+        # gone by the time it is looked at is skipped
+        out = []
+        try: it = os.scandir(self.root)
+        except OSError: return out
+        with it:
+            for e in it:
+                if e.name.endswith(".tmp"): continue
+                try:
+                    if e.is_file(): st = e.stat(); out.append((st.st_mtime, st.st_size, Path(e.path)))
+                except OSError: pass
+        return out
+
+    @property
+    def nbytes(self): return sum(f[1] for f in self.entries())
+
+    def evict(self):
+        # Stale entries first: of one source and kind only the newest state is kept (the current one is touched on every
+        # load). Then LRU by mtime, oldest entries go first
+        files = sorted(self.entries(), key=lambda t: t[0], reverse=True); seen = set(); keep = []
+        for f in files:
+            ph, _, rest = f[2].name.partition("-"); kind = rest.partition(".")[2]
+            if (ph, kind) in seen:
+                try: f[2].unlink(missing_ok=True)
+                except OSError: pass
+            else: seen.add((ph, kind)); keep.append(f)
+        total = sum(f[1] for f in keep)
+        for _, size, p in reversed(keep):
+            if total <= self.max_bytes: break
+            try: p.unlink(); total -= size
+            except OSError: pass
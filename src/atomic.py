@@ -0,0 +1,14 @@
+import os
+import uuid
+from pathlib import Path
+
+
+def atomic_write(path, writer, mode="wb"):
+    # writer(f) fills a temp file next to path, which then replaces path in one rename: a crash or a failing
+    # writer never leaves a half-written file behind (the temp file is removed either way). Every call gets its own
+    # temp name, so threads or processes writing the same path at once each replace it whole
+    path = Path(path); tmp = path.with_name(f"{path.name}.{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        with open(tmp, mode, encoding=None if "b" in mode else "utf-8") as f: writer(f)
+        os.replace(tmp, path)
+    finally: tmp.unlink(missing_ok=True)
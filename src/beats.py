@@ -0,0 +1,84 @@
+import numpy as np
+from pcm import SR
+
+# Beat grid: spectral-flux onset envelope of one track, tempo from its autocorrelation, a comb of that period
+# for the phase, then beats tracked forward onto the strongest onset near each one. Built once per song
+# (drums stem when there is one) and cached; snapping is a binary search in the sorted beat times.
+N_FFT = 1024
+HOP = 512
+CHUNK = 512  # hops per FFT batch, like the spectrum index
+BPM_MIN, BPM_MAX, BPM_PRIOR = 60.0, 200.0, 120.0
+
+
+def onset_envelope(data):
+    # Half-wave rectified flux of log magnitudes (mono), minus its local mean so sustained parts do not count
+    n = max(0, (len(data) - N_FFT) // HOP + 1); env = np.zeros(n, np.float32); prev = None
+    win = np.hanning(N_FFT).astype(np.float32)
+    for h0 in range(0, n, CHUNK):
+        h1 = min(n, h0 + CHUNK); idx = np.arange(h0, h1)[:, None] * HOP + np.arange(N_FFT)
+        mag = np.log1p(np.abs(np.fft.rfft(data[idx].mean(axis=2, dtype=np.float32) * win, axis=1)))
+        stack = mag if prev is None else np.vstack((prev, mag))
+        env[h0 + (prev is None):h1] = np.maximum(np.diff(stack, axis=0), 0).sum(axis=1); prev = mag[-1:]
+    if n > 16: env = np.maximum(env - np.convolve(env, np.ones(16, np.float32) / 16, mode="same"), 0)
+    return env
+
+
+class BeatGrid:
+    def __init__(self, times_ms, period_ms):
+        self.times = np.asarray(times_ms, np.float64); self.period_ms = float(period_ms)
+
+    @classmethod
+    def build(cls, data):
+        env = onset_envelope(data); n = len(env)
+        if n < 64 or not env.any(): return cls([], 0.0)
+        # Tempo: autocorrelation (via FFT) over the allowed lags, weighted towards BPM_PRIOR on a log scale
+        ac = np.fft.irfft(np.abs(np.fft.rfft(env, 2 * n)) ** 2)[:n]
+        rate = SR / HOP; lags = np.arange(max(1, int(rate * 60 / BPM_MAX)), min(n - 1, int(rate * 60 / BPM_MIN) + 1))
+        if len(lags) < 3: return cls([], 0.0)
+        score = ac[lags] * np.exp(-0.5 * (np.log2(rate * 60 / lags / BPM_PRIOR) / 0.9) ** 2)
+        k = int(np.argmax(score)); lag = float(lags[k])
+        if 0 < k < len(lags) - 1:
+            a, b, c = score[k - 1:k + 2]; d = a - 2 * b + c
+            if d < 0: lag += 0.5 * (a - c) / d
+        # Phase: the comb offset over the first 16 beats (from the first onset) that collects the most onset energy,
+        # all offsets at once; later beats are left to the tracker so a slightly wrong tempo cannot shift the phase
+        floor = float(env[env > 0].mean()); start = int(np.argmax(env > floor))
+        beats = np.arange(16) * lag; phases = start + np.arange(int(lag) + 1)
+        cols = np.rint(phases[:, None] + beats[None, :]).astype(np.int64); ok = cols < n
+        h = float(phases[int(np.argmax(np.where(ok, env[np.minimum(cols, n - 1)], 0).sum(axis=1)))])
+        # Track forward from there: each beat is predicted one period after the last and pulled onto the strongest
+        # onset within an eighth of a beat, so tempo error or a drifting band never accumulates
+        w = max(1, int(lag / 8)); hops = []
+        while h < n:
+            lo = max(0, int(h) - w); seg = env[lo:int(h) + w + 1]; k = int(np.argmax(seg))
+            if seg[k] > floor: h = float(lo + k)
+            hops.append(h); h += lag
+        hops = np.array(hops)
+        period = float(np.median(np.diff(hops))) if len(hops) > 1 else lag
+        return cls((hops * HOP + N_FFT / 2) * 1000.0 / SR, period * HOP * 1000.0 / SR)
+
+    def save(self, f): np.savez(f, times=self.times, period=np.float64(self.period_ms))
+
+    @classmethod
+    def load(cls, f):
+        with np.load(f) as z: return cls(z["times"], float(z["period"]))
+
+    @property
+    def nbytes(self): return self.times.nbytes
+
+    @property
+    def bpm(self): return 60000.0 / self.period_ms if self.period_ms > 0 else None
+
+    def snap(self, ms):
+        # Nearest beat to ms (binary search), ms itself when there are no beats
+        if len(self.times) == 0: return ms
+        i = int(np.searchsorted(self.times, ms))
+        near = self.times[max(0, i - 1):i + 1]
+        return float(near[np.argmin(np.abs(near - ms))])
+
+
+def load_beats(assets, track):
+    # Cached next to the PCM like peaks and spectrum; a track still streaming has no grid yet
+    if track is None or not getattr(track, "complete", True): return None
+    if track.path is None: return BeatGrid.build(track.data[:track.frames])
+    return assets.cached(track.path, "beats", BeatGrid.load, lambda: BeatGrid.build(track.data[:track.frames]), BeatGrid.save)
@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+from engine import Engine
+from export import mixdown
+from memory import peak_rss
+from mixer import NullOutput
+from pcm import SR, CHANNELS, PcmTrack, write_wav
+from songs import LoadedSong
+from stretch import StretchedTrack, wsola
+
+# Headless benchmark of the playback engine on synthetic songs, no sound card, network or real MP3s needed.
+# Results go to one JSON file per run so two versions can be compared with any diff/JSON tool.
+BASE_DIR = Path(__file__).parent
+STEMS = ["bass", "drums", "other", "vocals"]
+
+
+def synth_song(folder, seconds, seed=0):
+    # Original + 4 stems as native WAV (sines, noise hits, a chord pad) and an LRC line every 4 s
+    rng = np.random.default_rng(seed); n = int(seconds * SR); t = np.arange(n, dtype=np.float32) / SR
+    beat = (t * 2.0) % 1.0; env = np.exp(-beat * 12).astype(np.float32)
+    stems = {
+        "bass": np.sin(2 * np.pi * 55 * t) * 0.5,
+        "drums": rng.standard_normal(n).astype(np.float32) * env * 0.4,
+        "other": sum(np.sin(2 * np.pi * f * t) for f in (261.6, 329.6, 392.0)) * 0.12,
+        "vocals": np.sin(2 * np.pi * (440 + 30 * np.sin(2 * np.pi * 0.5 * t)) * t) * 0.25 * (np.sin(np.pi * t / 4) > 0),
+    }
+    stems_dir = folder / "stems"; stems_dir.mkdir(parents=True, exist_ok=True); mix = np.zeros(n, np.float32)
+    for name, x in stems.items():
+        x = x.astype(np.float32); mix += x
+        write_wav(stems_dir / f"{name}.wav", (np.repeat(x[:, None], CHANNELS, axis=1) * 32767).astype(np.int16))
+    write_wav(folder / "original.wav", (np.repeat(np.clip(mix, -1, 1)[:, None], CHANNELS, axis=1) * 32767).astype(np.int16))
+    lines = [f"[{int(s // 60):02d}:{s % 60:05.2f}]<{int(s // 60):02d}:{s % 60:05.2f}>line <{int(s // 60):02d}:{(s + 1) % 60:05.2f}>{k}" for k, s in enumerate(range(0, int(seconds), 4))]
+    (folder / "original.lrc").write_text("\n".join(lines), encoding="utf-8")
+    return folder
+
+
+def song_for(folder):
+    paths = [folder / "original.wav"] + [folder / "stems" / f"{s}.wav" for s in STEMS]
+    return LoadedSong(folder.name, None, paths, [p.name for p in paths], [f"{s}.wav" for s in STEMS], folder / "original.lrc", paths[0])
+
+
+def stats(xs):
+    xs = np.asarray(xs, dtype=np.float64) * 1000.0
+    return {"n": len(xs), "mean_ms": round(float(xs.mean()), 3), "p50_ms": round(float(np.percentile(xs, 50)), 3),
+            "p95_ms": round(float(np.percentile(xs, 95)), 3), "max_ms": round(float(xs.max()), 3)}
+
+
+def wait_for(cond, t0=None, timeout=30.0):
+    # Seconds from t0 (default: now) until cond() holds, None on timeout
+    t0 = time.perf_counter() if t0 is None else t0
+    while not cond():
+        if time.perf_counter() - t0 > timeout: return None
+        time.sleep(0.0005)
+    return time.perf_counter() - t0
+
+
+def load(engine, song):
+    # Tracks + peaks (what the player needs to show and play the song), then until every spectrum is indexed
+    t0 = time.perf_counter(); engine.fill(song); t_tracks = time.perf_counter() - t0
+    wait_for(lambda: all(s is not None for s in song.spectra)); t_all = time.perf_counter() - t0
+    engine.set_song(song)
+    return {"tracks_ms": round(t_tracks * 1000, 2), "with_spectrum_ms": round(t_all * 1000, 2)}
+
+
+def output(kind):
+    # pygame on SDL's dummy driver runs the real output thread and clock without a device; NullOutput if pygame is missing
+    if kind == "pygame":
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+        try:
+            import pygame
+            from mixer import PygameOutput
+            pygame.mixer.pre_init(SR, -16, CHANNELS, 512); pygame.mixer.init()
+            return PygameOutput(buffer=512), f"pygame {pygame.mixer.get_init()}"
+        except Exception as e: print(f"⚠ pygame output unavailable ({e}), using NullOutput")
+    return NullOutput(realtime=True), "null"
+
+
+def bench_song(folder, seconds, out_kind, repeats):
+    cache = Path(tempfile.mkdtemp(prefix="stemquina-bench-cache-")); res = {"seconds": seconds}
+    try:
+        out, res["output"] = output(out_kind); engine = Engine(cache, out)
+        res["load_cold"] = load(engine, song_for(folder))
+        res["load_warm"] = load(engine, song_for(folder)); song = engine.song; mixer = engine.mixer
+
+        # Seek/play: start() until the first block is handed to the output, and until the clock reports the new position
+        first, heard = [], []
+        for k in range(repeats):
+            ms = (k * 7919) % max(1, int(seconds * 1000) - 5000); engine.stop()
+            t0 = time.perf_counter(); engine.start(ms)
+            first.append(wait_for(lambda: mixer.out_frames > 0, t0) or 0.0)
+            heard.append(wait_for(lambda: engine.position() > ms, t0) or 0.0)
+        res["seek_play_first_block"] = stats(first); res["seek_play_heard"] = stats(heard); res["clock"] = engine.clock.summary()
+
+        # Speed change: the synchronous part (segment under the playhead) is what delays the restart
+        sp = []
+        for k, speed in enumerate([0.5, 0.75, 0.9, 1.1, 1.25, 0.8] * max(1, repeats // 6)):
+            ms = 10000 + k * 3000 % max(1, int(seconds * 1000) - 20000)
+            engine.stop(); t0 = time.perf_counter(); engine.start(ms, speed); sp.append(wait_for(lambda: mixer.out_frames > 0, t0) or 0.0)
+        res["speed_change"] = stats(sp); engine.stop(); mixer.stretch.clear()
+
+        # Loop wrap: seam build after set_loop, then render cost of the blocks that cross B -> A vs plain blocks
+        seam, wrap, plain = [], [], []; mixer.speed = 1.0
+        for k in range(repeats):
+            a = 5000 + k * 1000 % max(1, int(seconds * 1000) - 15000); b = a + 2000
+            t0 = time.perf_counter(); engine.set_loop(a, b); seam.append(wait_for(lambda: mixer.seam is not None, t0) or 0.0)
+            mixer.seek_ms(b - 100); w0 = mixer.wraps
+            with mixer.lock:
+                while mixer.wraps == w0:
+                    t0 = time.perf_counter(); mixer._render(mixer.block); (wrap if mixer.wraps != w0 else plain).append(time.perf_counter() - t0)
+        engine.set_loop(None, None); res["loop_seam"] = stats(seam); res["loop_wrap_block"] = stats(wrap); res["plain_block"] = stats(plain)
+
+        # Waveform: full song at a typical canvas width and a 10 s zoom, per track
+        pyr = song.peaks[0]; frames = song.tracks[0].frames; full, zoom = [], []
+        for k in range(repeats * 5):
+            t0 = time.perf_counter(); pyr.columns(0, frames, 1400); full.append(time.perf_counter() - t0)
+            s = (k * 104729) % max(1, frames - 10 * SR); t0 = time.perf_counter(); pyr.columns(s, s + 10 * SR, 1400); zoom.append(time.perf_counter() - t0)
+        res["waveform_full"] = stats(full); res["waveform_zoom_10s"] = stats(zoom)
+
+        # One UI tick minus Tk: playhead, EQ bands, lyrics line/word, five mini-scopes
+        ticks = []; engine.start(0)
+        for k in range(repeats * 50):
+            t0 = time.perf_counter(); ms = engine.position(); engine.bands(ms)
+            i = song.lyrics.line_at(ms); song.lyrics.word_at(i, ms); f = int(ms * SR / 1000)
+            for p in song.peaks:
+                if p is not None: p.columns(f - SR, f + SR, 40)
+            ticks.append(time.perf_counter() - t0); time.sleep(0.002)
+        res["ui_tick"] = stats(ticks); engine.shutdown()
+    finally: shutil.rmtree(cache, ignore_errors=True)
+    return res
+
+
+def check_stretch(seconds=20.0):
+    # Playback renders the stretch in segments (and a head slice at the playhead): at every speed that has to be
+    # sample-identical to one WSOLA pass over the whole song, or each segment boundary clicks
+    t = np.arange(int(seconds * SR), dtype=np.float32) / SR; rng = np.random.default_rng(0)
+    x = sum(np.sin(2 * np.pi * f * t) for f in (261.6, 329.6, 392.0)) * 0.25 + rng.standard_normal(len(t)).astype(np.float32) * 0.02
+    tr = PcmTrack((np.repeat(x[:, None], CHANNELS, axis=1) * 32767).astype(np.int16), None); bad = []
+    for speed in (0.5, 0.75, 0.8, 0.9, 1.1, 1.25, 1.5, 2.0):
+        st = StretchedTrack(tr, speed); st.render_head(int(SR * 3.3 / speed))
+        head = st.data[st.head[0]:st.head[1]].copy()
+        for j in range(len(st.ready)): st.render_segment(j)
+        one = wsola(tr.data, speed, 0, st.out_frames)
+        if not np.array_equal(st.data, one) or not np.array_equal(head, one[st.head[0]:st.head[1]]): bad.append(speed)
+    return not bad, "segmented stretch == one-shot at 8 speeds" if not bad else f"segmented stretch differs at {bad}"
+
+
+def check_export_loops():
+    # An exported A-B loop is `repeats` passes of (B - A) / speed frames, also for loops shorter than a render block
+    t = np.arange(SR * 6, dtype=np.float32) / SR; x = (np.sin(2 * np.pi * 220 * t) * 0.3 * 32767).astype(np.int16)
+    tr = PcmTrack(np.repeat(x[:, None], CHANNELS, axis=1), None); tracks = [tr] + [None] * 4; bad = []; n = 0
+    work = Path(tempfile.mkdtemp(prefix="stemquina-check-"))
+    try:
+        for a, b in ((1000, 1050), (1000, 1300), (1000, 1400), (1000, 1500), (500, 2200), (1000, 3500)):
+            for speed in (1.0, 0.8, 0.5, 1.25):
+                for repeats in (1, 2, 3, 4, 7):
+                    frames, _ = mixdown(tracks, work / "loop.wav", [0.8] * 5, [False] * 5, speed=speed, loop=(a, b), repeats=repeats)
+                    want = repeats * (b - a) * SR / 1000.0 / round(speed, 2); n += 1
+                    if abs(frames - want) > 2 * repeats: bad.append((b - a, speed, repeats, frames, round(want)))
+    finally: shutil.rmtree(work, ignore_errors=True)
+    return not bad, f"exported loop lengths right in {n} cases" if not bad else f"exported loop lengths wrong (ms, speed, repeats, frames, expected): {bad[:5]}"
+
+
+CHECKS = [check_stretch, check_export_loops]
+
+
+def checks():
+    ok = True
+    for check in CHECKS:
+        good, what = check(); ok &= good; print(f"{'✅' if good else '❌'} {what}")
+    return ok
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Headless StemQuina engine benchmark on synthetic songs")
+    ap.add_argument("-s", "--seconds", type=float, nargs="+", default=[60.0, 240.0], help="song lengths to generate")
+    ap.add_argument("-r", "--repeats", type=int, default=12, help="samples per measurement")
+    ap.add_argument("--output", choices=["pygame", "null"], default="pygame", help="audio backend (pygame uses SDL's dummy driver)")
+    ap.add_argument("-o", "--out", type=Path, help="JSON result file (default: logs/bench-<time>.json)")
+    ap.add_argument("--check", action="store_true", help="only run the correctness checks (exit code 1 on a failure)")
+    args = ap.parse_args()
+    if args.check: sys.exit(0 if checks() else 1)
+
+    out_path = args.out or BASE_DIR / "logs" / f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    result = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "python": sys.version.split()[0], "numpy": np.__version__,
+              "platform": platform.platform(), "cpus": os.cpu_count(), "repeats": args.repeats, "songs": []}
+    work = Path(tempfile.mkdtemp(prefix="stemquina-bench-"))
+    try:
+        for k, secs in enumerate(args.seconds):
+            t0 = time.perf_counter(); folder = synth_song(work / f"synthetic-{int(secs)}s", secs, seed=k)
+            print(f"🎛 {folder.name}: generated in {time.perf_counter() - t0:.1f} s")
+            res = bench_song(folder, secs, args.output, args.repeats); result["songs"].append(res)
+            print(f"✅ {folder.name}: load {res['load_warm']['tracks_ms']:.1f} ms, seek {res['seek_play_first_block']['p50_ms']:.1f} ms, "
+                  f"speed {res['speed_change']['p50_ms']:.1f} ms, tick {res['ui_tick']['p50_ms']:.2f} ms")
+    finally: shutil.rmtree(work, ignore_errors=True)
+    r = peak_rss(); result["peak_rss_mb"] = round(r / 1024 ** 2, 1) if r else None
+    out_path.parent.mkdir(parents=True, exist_ok=True); out_path.write_text(json.dumps(result, indent=4), encoding="utf-8")
+    print(f"💾 {out_path}")
+
+
+if __name__ == "__main__":
+    main()
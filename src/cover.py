@@ -0,0 +1,25 @@
+from io import BytesIO
+from PIL import Image
+from mutagen.id3 import ID3, APIC
+
+SIZE = (110, 110)
+
+
+def extract(mp3):
+    # First embedded picture of an MP3, scaled for the sidebar; None without one
+    try:
+        for tag in ID3(mp3).values():
+            if isinstance(tag, APIC): img = Image.open(BytesIO(tag.data)).resize(SIZE); img.load(); return img
+    except Exception: pass
+    return None
+
+
+def read(p):
+    if p.stat().st_size == 0: return None
+    img = Image.open(p); img.load(); return img
+
+
+def load_cover(assets, mp3):
+    # Thumbnail cached as PNG; an empty entry records "no cover" so the tags are not read again
+    if mp3 is None: return None
+    return assets.cached(mp3, "cover", read, lambda: extract(mp3), lambda img, f: img.save(f, "PNG") if img is not None else None)
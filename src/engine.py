@@ -0,0 +1,93 @@
+import threading
+import time
+from assets import AssetCache
+from beats import load_beats
+from loader import TrackLoader
+from lyrics import load_lyrics
+from mixer import Mixer, ClockMonitor
+from pcm import SR
+from spectrum import load_spectrum
+from stretch import StretchCache, StretchRenderer
+from waveform import load_peaks
+
+
+class Engine:
+    # Everything audio without Tk: loading, mixing, time-stretch, A-B loop and the playhead clock.
+    # The player is a view on top of it; benchmarks and tools drive it directly.
+    def __init__(self, cache_root, output=None, n_tracks=5):
+        self.assets = AssetCache(cache_root); self.loader = TrackLoader(self.assets)
+        self.mixer = Mixer(n_tracks, output); self.mixer.stretch = StretchCache(); self.stretcher = StretchRenderer(self.mixer.stretch)
+        self.clock = ClockMonitor(self.mixer); self.song = None
+        self.speed = 1.0; self.start_ref = 0.0; self.seen_wraps = 0
+
+    # --- loading ---
+    def fill(self, song, on_track=None, is_current=lambda: True, on_complete=None):
+        # Decodes song's tracks into it (original first), with peaks; spectra follow in their own threads
+        song.lyrics = load_lyrics(self.assets, song.lrc)
+        def ready(i, tr):
+            if tr is not None:
+                song.tracks[i] = tr; song.peaks[i] = load_peaks(self.assets, tr); self.index_spectrum(song, i, tr)
+                if i == self.beat_source(song): self.index_beats(song, i, tr)
+            if on_track: on_track(i)
+        self.loader.load(song.paths, ready, is_current, on_complete)
+        if is_current(): song.complete = True
+
+    def complete_track(self, song, track):
+        # A streamed track finished decoding: full peaks and the spectrum index can be built now
+        if track not in song.tracks: return None
+        idx = song.tracks.index(track); song.peaks[idx] = load_peaks(self.assets, track); self.index_spectrum(song, idx, track)
+        if idx == self.beat_source(song): self.index_beats(song, idx, track)
+        return idx
+
+    def index_spectrum(self, song, idx, track, wait=False):
+        # STFT of a whole track is too slow for the loader thread, it runs (or comes from the cache) in its own thread
+        def run():
+            spec = load_spectrum(self.assets, track)
+            if spec is not None and song.tracks[idx] is track: song.spectra[idx] = (track, spec)
+        t = threading.Thread(target=run, daemon=True); t.start()
+        if wait: t.join()
+
+    def beat_source(self, song):
+        # Slot the beat grid is built from: the drums stem when one is mapped, else the original
+        return next((i for i, m in enumerate(song.mappings) if m and "drum" in str(m).lower() and song.paths[i] is not None), 0)
+
+    def index_beats(self, song, idx, track):
+        # Onset analysis of one whole track, in its own thread like the spectrum (a streaming track waits for complete_track)
+        def run():
+            grid = load_beats(self.assets, track)
+            if grid is not None and song.tracks[idx] is track: song.beats = grid
+        threading.Thread(target=run, daemon=True).start()
+
+    def set_song(self, song):
+        self.stop(); self.song = song; self.mixer.set_tracks(song.tracks)
+
+    def set_track(self, idx, track): self.mixer.set_track(idx, track)
+
+    # --- transport ---
+    def prepare_speed(self, ms, speed):
+        # Time-stretch keeps pitch; the segment under the playhead is rendered now, the rest in the background
+        self.stretcher.prepare(self.mixer.tracks, speed, ms * SR / 1000.0)
+
+    def start(self, ms, speed=1.0):
+        self.speed = speed; self.prepare_speed(ms, speed); self.mixer.speed = speed; self.mixer.seek_ms(ms)
+        self.start_ref = time.monotonic() - (ms / (1000.0 * speed)); self.seen_wraps = self.mixer.wraps; self.mixer.play()
+
+    def stop(self): self.mixer.pause()
+
+    def set_loop(self, a_ms, b_ms): self.mixer.set_loop(a_ms, b_ms)
+
+    def position(self):
+        # Playhead from the audio clock; the wall-clock estimate (wraps included) only feeds the drift numbers
+        if self.mixer.wraps != self.seen_wraps and self.mixer.loop:
+            a, b = self.mixer.loop; self.start_ref += (self.mixer.wraps - self.seen_wraps) * (b - a) / SR / self.speed
+        self.seen_wraps = self.mixer.wraps
+        return self.clock.sample((time.monotonic() - self.start_ref) * 1000.0 * self.speed)
+
+    # --- per-tick lookups ---
+    def bands(self, ms, idx=0):
+        # Spectrum of track idx at ms as (channels, bands) float16, None while it is not indexed
+        sp = self.song.spectra[idx] if self.song is not None else None
+        if sp is None or sp[0] is not self.mixer.tracks[idx]: return None
+        return sp[1].at(sp[0].frame_at(ms))
+
+    def shutdown(self): self.stop(); self.loader.shutdown()
@@ -0,0 +1,129 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import wave
+from pathlib import Path
+import numpy as np
+from pydub import AudioSegment
+from assets import AssetCache
+from library import stem_files, stem_slots
+from mixer import Mixer, NullOutput
+from pcm import SR, CHANNELS, PcmTrack
+from stretch import StretchStreams
+
+# Offline mixdown: the playback Mixer itself renders into a file, so gains, mutes, time-stretch and the crossfaded
+# A-B loop sound exactly as heard. One-second blocks are mixed and written as they come, memory stays flat.
+BLOCK = SR
+BITRATE = 256
+
+
+class WavSink:
+    def __init__(self, path):
+        self.w = wave.open(str(path), "wb"); self.w.setnchannels(CHANNELS); self.w.setsampwidth(2); self.w.setframerate(SR)
+    def write(self, block): self.w.writeframes(block.tobytes())
+    def close(self): self.w.close()
+
+
+class Mp3Sink:
+    # Raw PCM piped into ffmpeg, encoded while the mix is rendered
+    def __init__(self, path, bitrate=BITRATE):
+        cmd = [AudioSegment.converter, "-v", "error", "-y", "-f", "s16le", "-ac", str(CHANNELS), "-ar", str(SR), "-i", "-", "-b:a", f"{bitrate}k", "-f", "mp3", str(path)]
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    def write(self, block): self.proc.stdin.write(block.tobytes())
+    def close(self):
+        self.proc.stdin.close(); err = self.proc.stderr.read().decode(errors="replace"); self.proc.wait()
+        if self.proc.returncode != 0: raise RuntimeError(f"ffmpeg failed: {err.strip()}")
+
+
+def mixdown(tracks, path, vols, mutes, master=0.8, speed=1.0, loop=None, repeats=1, start_ms=0.0, end_ms=None, bitrate=BITRATE, progress=None):
+    # tracks: the player's 5 slots (None = empty). With loop=(a_ms, b_ms) the render starts at A, wraps B -> A through
+    # the same seam as playback repeats-1 times and ends at B; otherwise it runs from start_ms to end_ms (or the end).
+    # MP3 when path ends in .mp3. Written to a temp file first; returns (output frames, seconds it took).
+    path = Path(path); t0 = time.perf_counter()
+    for t in tracks:
+        # A track still streaming from ffmpeg is rendered once it is complete
+        if t is not None and hasattr(t, "wait"): t.wait(0, t.frames)
+    mixer = Mixer(len(tracks), NullOutput(), block=BLOCK); mixer.set_tracks(tracks); mixer.master = master; mixer.speed = round(speed, 2)
+    for i in range(len(tracks)): mixer.set_volume(i, vols[i]); mixer.set_mute(i, mutes[i])
+    if mixer.speed != 1.0: mixer.stretch = StretchStreams()
+    if loop is not None and loop[1] > loop[0]:
+        mixer.loop = (loop[0] * SR / 1000.0, loop[1] * SR / 1000.0); mixer.pos = mixer.loop[0]; end = mixer.loop[1]
+        # The wrap limit is checked inside the render, a loop shorter than a block can wrap several times in one
+        mixer.max_wraps = repeats - 1
+    else:
+        loop = None; mixer.pos = max(0.0, start_ms * SR / 1000.0); end = mixer.frames if end_ms is None else min(mixer.frames, end_ms * SR / 1000.0)
+    total = ((end - mixer.pos) + (repeats - 1) * (mixer.loop[1] - mixer.loop[0] if loop else 0)) / mixer.speed
+    tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+    sink = Mp3Sink(tmp, bitrate) if path.suffix.lower() == ".mp3" else WavSink(tmp); done = 0
+    try:
+        while mixer.pos < end:
+            # The last pass plays out to B instead of wrapping: the block is cut where its last piece (the one after
+            # the final wrap, if any) reaches the end
+            block = mixer._render(BLOCK); off, pos = mixer.timeline[-1][2][-1]
+            if mixer.pos > end: block = block[:off + max(0, int(np.ceil((end - pos) / mixer.speed)))]
+            sink.write(block); done += len(block); mixer.timeline.clear()
+            if progress: progress(min(1.0, done / max(1.0, total)))
+        sink.close(); os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            try: sink.close()
+            except Exception: pass
+            tmp.unlink(missing_ok=True)
+    return done, time.perf_counter() - t0
+
+
+def song_mix(db_dir, name):
+    # Tracks and mix of a song as the player last saved it in metadata.json (slot mapping, volumes, mutes, A-B loop)
+    d = Path(db_dir) / name; meta = {}
+    try:
+        with open(d / "metadata.json", "r", encoding="utf-8") as f: meta = json.load(f)
+    except (OSError, ValueError): pass
+    # Slots resolved like the player does: WAV stems over their MP3 copies, saved choices, then drum/bass/other/vocal
+    saved = [Path(m.replace("\\", "/")).name if m != "NONE" else "NONE" for m in meta.get("track_mappings", [])] + ["NONE"] * 5
+    mp3s = sorted(d.glob("*.mp3"))
+    files = [mp3s[0].name if mp3s else None] + [f if f != "NONE" else None for f in stem_slots(stem_files(d / "stems"), saved[1:5])]
+    paths = [(d / f if i == 0 else d / "stems" / f) if f else None for i, f in enumerate(files)]
+    return paths, (meta.get("volumes", []) + [0.8] * 5)[:5], (meta.get("mutes", []) + [False] * 5)[:5], (meta.get("loop_a"), meta.get("loop_b"))
+
+
+def main():
+    base = Path(sys.executable).parent if getattr(sys, 'frozen', False) else Path(__file__).parent
+    ap = argparse.ArgumentParser(description="Render a StemQuina song's mix to WAV or MP3")
+    ap.add_argument("song", help="song folder name in database/")
+    ap.add_argument("-o", "--out", type=Path, help="output .wav or .mp3 (default: <song>.wav)")
+    ap.add_argument("-s", "--speed", type=float, default=1.0)
+    ap.add_argument("-m", "--master", type=float, default=0.8)
+    ap.add_argument("--mute", action="append", default=[], help="slot number (0 = original) or stem name, repeatable")
+    ap.add_argument("--unmute", action="append", default=[], help="slot number or stem name, repeatable")
+    ap.add_argument("--vol", action="append", default=[], help="SLOT=VOLUME, e.g. vocals=0.5, repeatable")
+    ap.add_argument("-r", "--repeats", type=int, help="render the saved A-B loop this many times (default: whole song)")
+    ap.add_argument("--loop", type=float, nargs=2, metavar=("A", "B"), help="loop in seconds instead of the saved one")
+    ap.add_argument("-b", "--bitrate", type=int, default=BITRATE)
+    args = ap.parse_args()
+
+    paths, vols, mutes, saved_loop = song_mix(base / "database", args.song)
+    def slot(key):
+        if key.isdigit() and int(key) < len(paths): return int(key)
+        i = next((i for i, p in enumerate(paths) if p is not None and key.lower() in p.name.lower()), None)
+        if i is None: ap.error(f"no slot or stem matching {key!r} in {args.song} ({', '.join(p.name for p in paths if p is not None)})")
+        return i
+    for k in args.mute: mutes[slot(k)] = True
+    for k in args.unmute: mutes[slot(k)] = False
+    for kv in args.vol:
+        k, _, v = kv.partition("=")
+        try: vols[slot(k)] = float(v)
+        except ValueError: ap.error(f"--vol expects SLOT=VOLUME, got {kv!r}")
+    assets = AssetCache(base / "cache")
+    tracks = [PcmTrack(assets.load_pcm(p), p) if p is not None and p.exists() else None for p in paths]
+    loop = (args.loop[0] * 1000, args.loop[1] * 1000) if args.loop else tuple(sorted(saved_loop)) if args.repeats and None not in saved_loop else None
+    out = args.out or Path(f"{args.song}.wav")
+    frames, secs = mixdown(tracks, out, vols, mutes, args.master, args.speed, loop, args.repeats or 1, bitrate=args.bitrate,
+                           progress=lambda p: print(f"\r⏳ {p * 100:5.1f} %", end="", flush=True))
+    print(f"\n✅ {out}: {frames / SR:.1f} s of audio in {secs:.1f} s ({frames / SR / max(secs, 1e-9):.0f}x realtime)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+# Library index: one row per song folder in database/. A folder is only re-read when its own mtime or the
+# mtime of its stems/ folder changed, so a rescan of an unchanged library is one stat() per song.
+SCHEMA = """CREATE TABLE IF NOT EXISTS songs (
+    name TEXT PRIMARY KEY, mtime INTEGER, stems_mtime INTEGER, original TEXT, stems TEXT, lyrics TEXT,
+    duration_ms INTEGER, markers INTEGER, tags TEXT, cover TEXT)"""
+
+
+KEYWORDS = ["drum", "bass", "other", "vocal"]
+
+
+def stem_files(stems_dir):
+    # Stem file names of a song; a stem written natively as WAV wins over an MP3 export of the same stem
+    if not stems_dir.is_dir(): return []
+    files = sorted((f for f in stems_dir.iterdir() if f.suffix.lower() in (".mp3", ".wav")), key=lambda f: (f.suffix.lower() == ".wav", f.name))
+    return sorted({f.stem: f.name for f in files}.values())
+
+
+def stem_slots(stems, saved=("NONE",) * 4):
+    # File names for slots 1-4: the saved choice while that stem still exists, else the first stem with the slot's
+    # keyword (drum, bass, other, vocal), then whatever is left over
+    slots = ["NONE"] * 4; left = list(stems)
+    for i, kw in enumerate(KEYWORDS):
+        s = saved[i] if i < len(saved) and saved[i] in left else next((s for s in left if kw in s.lower()), None)
+        if s: slots[i] = s; left.remove(s)
+    for i in range(4):
+        if slots[i] == "NONE" and left: slots[i] = left.pop(0)
+    return slots
+
+
+def _mtime(p):
+    try: return p.stat().st_mtime_ns
+    except OSError: return 0
+
+
+class Library:
+    def __init__(self, db_path, index_path):
+        self.db_path = Path(db_path); self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(index_path), check_same_thread=False)
+        with self.lock: self.conn.execute(SCHEMA); self.conn.commit()
+
+    def _read(self, name):
+        # Everything the player needs from a song folder, gathered once
+        d = self.db_path / name; stems_dir = d / "stems"
+        mp3s = sorted(d.glob("*.mp3")); orig = mp3s[0] if mp3s else None
+        stems = stem_files(stems_dir)
+        lrc = next(iter(sorted(d.glob("*.lrc"))), None)
+        duration = 0; cover = None
+        if orig is not None:
+            try:
+                from mutagen.mp3 import MP3
+                mp3 = MP3(orig); duration = int(mp3.info.length * 1000)
+                if mp3.tags is not None and mp3.tags.getall("APIC"): cover = orig.name
+            except Exception: pass
+        markers = 0; tags = []
+        meta = d / "metadata.json"
+        if meta.exists():
+            try:
+                with open(meta, "r", encoding="utf-8") as f: data = json.load(f)
+                markers = len(data.get("markers", [])); tags = data.get("tags", [])
+            except (OSError, ValueError): pass
+        return (name, _mtime(d), _mtime(stems_dir), orig.name if orig else None, json.dumps(stems), lrc.name if lrc else None,
+                duration, markers, " ".join(tags), cover)
+
+    def _stale(self, name, row):
+        d = self.db_path / name
+        return row is None or row[0] != _mtime(d) or row[1] != _mtime(d / "stems")
+
+    def scan(self, on_change=None, batch=200):
+        # Incremental: new/changed folders are re-read, vanished ones dropped; on_change() after every batch
+        names = sorted(x.name for x in self.db_path.iterdir() if x.is_dir()) if self.db_path.exists() else []
+        with self.lock: known = {r[0]: r[1:] for r in self.conn.execute("SELECT name, mtime, stems_mtime FROM songs")}
+        gone = set(known) - set(names); rows = []; changed = bool(gone)
+        if gone:
+            with self.lock: self.conn.executemany("DELETE FROM songs WHERE name = ?", [(n,) for n in gone]); self.conn.commit()
+        for name in names:
+            if not self._stale(name, known.get(name)): continue
+            rows.append(self._read(name))
+            if len(rows) >= batch:
+                self._store(rows); rows = []; changed = True
+                if on_change: on_change()
+        if rows: self._store(rows); changed = True
+        if changed and on_change: on_change()
+        return changed
+
+    def _store(self, rows):
+        with self.lock: self.conn.executemany("INSERT OR REPLACE INTO songs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows); self.conn.commit()
+
+    def search(self, text=""):
+        q = f"%{text.strip()}%"
+        with self.lock:
+            return [r[0] for r in self.conn.execute("SELECT name FROM songs WHERE name LIKE ? OR tags LIKE ? ORDER BY name COLLATE NOCASE", (q, q))]
+
+    def song(self, name):
+        # Layout of one song, re-read first if the folder changed since it was indexed
+        with self.lock: row = self.conn.execute("SELECT * FROM songs WHERE name = ?", (name,)).fetchone()
+        if row is None or self._stale(name, row[1:3]):
+            if not (self.db_path / name).is_dir(): return None
+            row = self._read(name); self._store([row])
+        keys = ("name", "mtime", "stems_mtime", "original", "stems", "lyrics", "duration_ms", "markers", "tags", "cover")
+        song = dict(zip(keys, row)); song["stems"] = json.loads(song["stems"])
+        return song
+
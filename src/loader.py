@@ -0,0 +1,74 @@
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from assets import AssetCache
+from pydub import AudioSegment
+from pcm import PcmTrack, StreamingPcm
+
+
+def _decode(cache_root, src):
+    # Runs in a worker process: decodes into the disk cache, the parent only memory-maps the result
+    AssetCache(cache_root).load_pcm(src); return str(src)
+
+
+class TrackLoader:
+    # Decodes the tracks of one song in parallel and hands each one over as soon as it is ready.
+    # Track 0 (original) is always delivered first so the UI can show and play it before the stems.
+    def __init__(self, assets, workers=None, stream=None):
+        self.assets = assets; self.workers = workers or min(5, os.cpu_count() or 1); self.pool = None
+        # Streaming mode: an uncached original is piped from ffmpeg and playable after its first block
+        self.stream = shutil.which(AudioSegment.converter) is not None if stream is None else stream
+
+    def _pool(self):
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self.pool
+
+    def track(self, src): return PcmTrack(self.assets.load_pcm(src), src)
+
+    def _stream_done(self, track, on_complete):
+        # Only a seamless single-pass decode goes to the cache, otherwise the pool re-decodes it cleanly
+        if track.seams == 0:
+            self.assets.write(self.assets.path_for(track.path, "pcm"), track.data[:track.frames]); track.adopt(self.assets.load_pcm(track.path))
+        else: self._pool().submit(_decode, str(self.assets.root), str(track.path)).add_done_callback(lambda f: self._adopt(track, f))
+        if on_complete: on_complete(track)
+
+    def _adopt(self, track, fut):
+        # A sample-exact re-decode of the same length replaces the streamed buffer (seams and all)
+        try: fut.result(); track.adopt(self.assets.load_pcm(track.path))
+        except Exception: pass
+
+    def load(self, paths, on_ready, is_current=lambda: True, on_complete=None):
+        todo = {i: p for i, p in enumerate(paths) if p is not None and p.exists()}
+        cached = [i for i, p in todo.items() if self.assets.has_pcm(p)]
+        streamed = 0 if self.stream and 0 in todo and 0 not in cached else None
+        held = []; first_done = 0 not in todo
+        if first_done: on_ready(0, None)
+
+        def finish(i, ok, tr=None):
+            nonlocal first_done
+            if not is_current(): return
+            if i != 0 and not first_done:
+                if ok: held.append(i)
+                return
+            if ok or i == 0: on_ready(i, (tr or self.track(todo[i])) if ok else None)
+            if i == 0:
+                first_done = True
+                for j in held: on_ready(j, self.track(todo[j]))
+                held.clear()
+
+        if streamed is not None: finish(0, True, StreamingPcm(todo[0], on_complete=lambda t: self._stream_done(t, on_complete)))
+        futures = {self._pool().submit(_decode, str(self.assets.root), str(p)): i for i, p in todo.items() if i not in cached and i != streamed}
+        for i in sorted(cached): finish(i, True)
+        for fut in as_completed(futures):
+            i = futures[fut]
+            try: fut.result(); ok = True
+            except Exception as e:
+                print(f"❌ Decode failed: {todo[i]} ({e})"); ok = False
+                if isinstance(e, BrokenProcessPool): self.pool = None
+            finish(i, ok)
+
+    def shutdown(self):
+        if self.pool: self.pool.shutdown(cancel_futures=True)
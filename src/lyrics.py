@@ -0,0 +1,76 @@
+import json
+import re
+from bisect import bisect_right
+from pathlib import Path
+
+# LRC with the common extensions: several [mm:ss.xx] stamps per line (repeated choruses), an [offset:ms] tag
+# and enhanced word timing (<mm:ss.xx> before words). Lines are sorted once, lookups are a bisect.
+STAMP = re.compile(r'\[(\d+):(\d+(?:[.:]\d+)?)\]')
+WORD = re.compile(r'<(\d+):(\d+(?:[.:]\d+)?)>')
+LEAD = re.compile(r'\s*((?:\[\d+:\d+(?:[.:]\d+)?\]\s*)+)')
+OFFSET = re.compile(r'\[offset:\s*([+-]?\d+)\s*\]', re.I)
+
+
+def to_ms(m, s): return (int(m) * 60 + float(s.replace(":", "."))) * 1000
+
+
+def stamp_ms(line):
+    # First [mm:ss.xx] of a line, None if it has none
+    m = STAMP.search(line)
+    return to_ms(*m.groups()) if m else None
+
+
+class Lyrics:
+    def __init__(self, lines=()):
+        # lines: (ms, text, [(word ms, start char, end char)]) sorted by ms
+        self.lines = sorted(lines, key=lambda l: l[0])
+        self.times = [l[0] for l in self.lines]
+        self.word_times = [[w[0] for w in l[2]] for l in self.lines]
+
+    @classmethod
+    def parse(cls, text):
+        m = OFFSET.search(text); offset = int(m.group(1)) if m else 0; lines = []
+        for raw in text.splitlines():
+            m = LEAD.match(raw)
+            if not m: continue
+            stamps = [to_ms(*g) for g in STAMP.findall(m.group(1))]
+            # Strip word tags; each word runs from its tag to the next one, without the spaces around it
+            body = raw[m.end():]; plain = ""; starts = []; last = 0
+            for w in WORD.finditer(body):
+                plain += body[last:w.start()]; last = w.end(); starts.append((to_ms(*w.groups()), len(plain)))
+            plain += body[last:]; cut = len(plain) - len(plain.lstrip()); words = []
+            for k, (t, a) in enumerate(starts):
+                e = starts[k + 1][1] if k + 1 < len(starts) else len(plain); seg = plain[a:e]
+                a += len(seg) - len(seg.lstrip()); seg = seg.strip()
+                if seg: words.append((t, a - cut, a - cut + len(seg)))
+            for st in stamps:
+                # Word stamps are absolute for the first occurrence; repeats of the line keep the same rhythm
+                shift = st - stamps[0]
+                lines.append((st - offset, plain.strip(), [(t + shift - offset, a, e) for t, a, e in words]))
+        return cls(lines)
+
+    @classmethod
+    def load(cls, path):
+        path = Path(path)
+        return cls.parse(path.read_text(encoding='utf-8')) if path.exists() else cls()
+
+    def __len__(self): return len(self.lines)
+
+    def ms(self, i): return self.lines[i][0]
+    def text(self, i): return self.lines[i][1]
+
+    def line_at(self, ms): return bisect_right(self.times, ms) - 1
+
+    def word_at(self, i, ms):
+        # Index of the word being sung in line i, -1 before its first word or for lines without word timing
+        return bisect_right(self.word_times[i], ms) - 1 if 0 <= i < len(self.lines) else -1
+
+    def word_span(self, i, w): return self.lines[i][2][w][1:]
+
+
+def load_lyrics(assets, path):
+    # Parsed lines cached as JSON next to the song's other assets, re-parsed only when the .lrc changes
+    path = Path(path)
+    if not path.exists(): return Lyrics()
+    return assets.cached(path, "lrc", lambda p: Lyrics(json.loads(p.read_text(encoding="utf-8"))), lambda: Lyrics.load(path),
+                         lambda ly, f: f.write(json.dumps(ly.lines).encode("utf-8")))
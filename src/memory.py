@@ -0,0 +1,38 @@
+import os
+import sys
+from pcm import is_mapped
+
+MB = 1024 ** 2
+
+
+def rss():
+    # Resident set size of this process in bytes, None where it cannot be read cheaply
+    try:
+        with open("/proc/self/statm") as f: return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError): pass
+    return peak_rss()
+
+
+def peak_rss():
+    try:
+        import resource
+        r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return r if sys.platform == "darwin" else r * 1024
+    except (ImportError, AttributeError): return None
+
+
+def report(tracks, names, peaks=(), spectra=(), stretch=None, assets=None, songs=None):
+    # One line per track (PCM buffer, heap or file-mapped, plus its waveform/spectrum data), then caches and process RSS
+    lines = ["💾 Memory report"]; heap = mapped = 0
+    for i, (tr, name) in enumerate(zip(tracks, names)):
+        if tr is None: continue
+        n = tr.data.nbytes; m = is_mapped(tr.data); mapped += n if m else 0; heap += 0 if m else n
+        pk = peaks[i].nbytes if i < len(peaks) and peaks[i] is not None else 0
+        sp = spectra[i][1].nbytes if i < len(spectra) and spectra[i] is not None else 0
+        lines.append(f"  {i} {name[:28]:<28} {tr.duration_ms / 1000:7.1f} s  pcm {n / MB:7.1f} MB {'mapped' if m else 'heap  '}  peaks {pk / MB:5.2f} MB  spectrum {sp / MB:5.2f} MB")
+    lines.append(f"  tracks total: {heap / MB:.1f} MB heap, {mapped / MB:.1f} MB mapped (pageable)")
+    if stretch is not None: lines.append(f"  stretch cache: {stretch.nbytes / MB:.1f} MB in {len(stretch.items)} tracks (limit {stretch.max_bytes / MB:.0f} MB)")
+    if songs is not None: lines.append(f"  song cache: {songs.nbytes / MB:.1f} MB in {len(songs.items)} songs (limit {songs.max_bytes / MB:.0f} MB)")
+    if assets is not None: lines.append(f"  asset cache on disk: {assets.nbytes / MB:.0f} MB (limit {assets.max_bytes / MB:.0f} MB)")
+    r = rss(); lines.append(f"  process RSS: {r / MB:.0f} MB" if r else "  process RSS: n/a")
+    return lines
@@ -0,0 +1,48 @@
+import json
+import threading
+import time
+from pathlib import Path
+from atomic import atomic_write
+
+DELAY = 0.5
+
+
+class MetadataStore:
+    # Latest metadata.json content per song kept in memory. Saves only replace the pending dict; a writer
+    # thread puts it on disk once nothing changed for DELAY seconds, so a held nudge button is one write.
+    def __init__(self, delay=DELAY):
+        self.delay = delay; self.pending = {}; self.deadline = 0.0
+        self.cv = threading.Condition(); self.io = threading.Lock()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def read(self, path):
+        path = Path(path)
+        with self.cv:
+            if path in self.pending: return self.pending[path]
+        with self.io:
+            if not path.exists(): return {}
+            try:
+                with open(path, "r", encoding="utf-8") as f: return json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"❌ Metadata unreadable: {path} ({e})"); return {}
+
+    def write(self, path, data):
+        with self.cv: self.pending[Path(path)] = data; self.deadline = time.monotonic() + self.delay; self.cv.notify()
+
+    def flush(self):
+        # Song switch / exit: everything pending goes to disk now, on the calling thread.
+        # Taking and writing happen under one lock, so an older snapshot can never land after a newer one.
+        with self.io:
+            with self.cv: items = list(self.pending.items()); self.pending.clear()
+            for path, data in items: self._save(path, data)
+
+    def _save(self, path, data):
+        try: atomic_write(path, lambda f: json.dump(data, f, indent=4), "w")
+        except OSError as e: print(f"❌ Metadata not saved: {path} ({e})")
+
+    def _run(self):
+        while True:
+            with self.cv:
+                while not self.pending or time.monotonic() < self.deadline:
+                    self.cv.wait(None if not self.pending else max(0.0, self.deadline - time.monotonic()))
+            self.flush()
@@ -0,0 +1,255 @@
+import threading
+import time
+from collections import deque
+import numpy as np
+from pcm import SR, CHANNELS
+
+BLOCK = 2048
+XFADE = 256
+
+
+class Mixer:
+    # Pulls fixed-size blocks from every track and mixes them in one vectorized step.
+    # Gains, mutes, solo and track swaps are read per block, so changes land on the next block.
+    def __init__(self, n_tracks=5, output=None, block=BLOCK):
+        self.n = n_tracks; self.block = block
+        self.tracks = [None] * n_tracks
+        self.vols = np.full(n_tracks, 0.8, dtype=np.float32)
+        self.mutes = np.zeros(n_tracks, dtype=bool)
+        self.solo = np.zeros(n_tracks, dtype=bool)
+        self.master = 0.8
+        self.speed = 1.0
+        self.pos = 0.0
+        self.playing = False
+        self.stretch = None
+        self.loop = None; self.seam = None; self.wraps = 0
+        # Offline export: after this many wraps the loop is ignored and the render plays on past B
+        self.max_wraps = None
+        # Rendered blocks not yet heard: (output frame, length, [(offset, source pos)], speed, render time)
+        self.timeline = deque(); self.out_frames = 0
+        self.lock = threading.Lock()
+        self.output = output if output is not None else NullOutput()
+        self.output.start(self.pull)
+
+    @property
+    def frames(self): return max([t.frames for t in self.tracks if t is not None], default=0)
+
+    @property
+    def pos_ms(self): return self.pos * 1000.0 / SR
+
+    def set_track(self, i, track): self.tracks[i] = track
+    def set_tracks(self, tracks):
+        with self.lock: self.tracks = list(tracks) + [None] * (self.n - len(tracks))
+    def set_volume(self, i, v): self.vols[i] = v
+    def set_mute(self, i, m): self.mutes[i] = m
+    def set_solo(self, i, on=True): self.solo[i] = on
+
+    def gains(self):
+        g = np.where(self.mutes, 0.0, self.vols).astype(np.float32)
+        if self.solo.any(): g[~self.solo] = 0.0
+        return g * np.float32(self.master)
+
+    def seek_ms(self, ms):
+        with self.lock: self.pos = max(0.0, ms * SR / 1000.0)
+        for t in self.tracks:
+            if t is not None: t.hint(int(self.pos))
+
+    def set_loop(self, a_ms, b_ms):
+        # A-B loop inside the audio path; the crossfaded seam is rebuilt in the background, playback never restarts
+        loop = (a_ms * SR / 1000.0, b_ms * SR / 1000.0) if a_ms is not None and b_ms is not None and b_ms > a_ms else None
+        with self.lock: self.loop = loop; self.seam = None
+        if loop: threading.Thread(target=self._seam, daemon=True).start()
+
+    def _source(self, i, speed):
+        tr = self.tracks[i]
+        return tr if speed == 1.0 or self.stretch is None else self.stretch.get(tr, speed)
+
+    def _seam(self):
+        # Per-track XFADE frames: the end of the loop fading out over the frames just before A fading in
+        loop, speed = self.loop, self.speed
+        if loop is None: return None
+        key = (loop, speed, tuple(id(t) for t in self.tracks)); seam = self.seam
+        if seam is not None and seam[0] == key: return seam
+        a, b = loop; xf = max(1, min(XFADE, int((b - a) / speed) // 2))
+        buf = np.zeros((self.n, xf, CHANNELS), dtype=np.float32); fade = np.linspace(0, 1, xf, endpoint=False, dtype=np.float32)[:, None]
+        for i, t in enumerate(self.tracks):
+            if t is None: continue
+            src = self._source(i, speed)
+            tail, _ = src.render(max(0, int(b - xf * speed)), xf, speed); buf[i, :len(tail)] += tail * (1 - fade[:len(tail)])
+            if a >= xf * speed: head, _ = src.render(int(a - xf * speed), xf, speed); buf[i, :len(head)] += head * fade[:len(head)]
+        seam = (key, buf, xf); self.seam = seam
+        return seam
+
+    def play(self): self.playing = True; self.output.resume()
+    def pause(self):
+        self.playing = False; self.output.flush()
+        with self.lock: self.timeline.clear(); self.out_frames = 0
+
+    def _entry(self):
+        # Timeline entry of the block the output is playing right now (minus its device buffer)
+        f = self.output.played_frames() - self.output.buffer
+        with self.lock:
+            while len(self.timeline) > 1 and self.timeline[1][0] <= f: self.timeline.popleft()
+            return (self.timeline[0], f) if self.timeline else (None, f)
+
+    def position(self):
+        # Source frame being heard: audio clock of the output mapped back through the rendered blocks
+        e, f = self._entry()
+        if e is None: return self.pos
+        out0, n, segs, speed, _ = e; off = min(n, max(0, f - out0))
+        seg = next((sg for sg in reversed(segs) if sg[0] <= off), segs[0])
+        return seg[1] + (off - seg[0]) * speed
+
+    def position_ms(self): return self.position() * 1000.0 / SR
+
+    def latency_ms(self):
+        # Render -> speaker time of the block being heard, None before the first block starts
+        e, _ = self._entry(); t = self.output.started(e[0]) if e is not None else None
+        return None if t is None else (t - e[4] + self.output.buffer / SR) * 1000.0
+
+    def _mix(self, pos, n, speed, g, live):
+        # One tensordot over all audible tracks, float32 (n, CHANNELS)
+        if not live: return np.zeros((n, CHANNELS), dtype=np.float32)
+        stack = np.zeros((len(live), n, CHANNELS), dtype=np.float32)
+        for k, i in enumerate(live):
+            chunk, _ = self._source(i, speed).render(pos, n, speed); stack[k, :len(chunk)] = chunk
+        return np.tensordot(g[live], stack, axes=1)
+
+    def mix(self, pos, n, speed=1.0):
+        # Returns (mixed int16 block, frames consumed in the source)
+        g = self.gains(); live = [i for i, t in enumerate(self.tracks) if t is not None and g[i] > 0]
+        return np.clip(self._mix(pos, n, speed, g, live), -32768, 32767).astype(np.int16), n * speed
+
+    def _render(self, n):
+        # n output frames from self.pos; an active loop wraps B -> A inside the block through the seam
+        g = self.gains(); live = [i for i, t in enumerate(self.tracks) if t is not None and g[i] > 0]
+        speed = self.speed; parts = []; left = n; segs = []
+        while left > 0:
+            loop = self.loop if self.max_wraps is None or self.wraps < self.max_wraps else None; segs.append((n - left, self.pos))
+            if loop is None or self.pos >= loop[1]:
+                parts.append(self._mix(int(self.pos), left, speed, g, live)); self.pos += left * speed; break
+            _, seam, xf = self._seam(); s0 = loop[1] - xf * speed
+            if self.pos < s0:
+                k = min(left, max(1, int(np.ceil((s0 - self.pos) / speed))))
+                parts.append(self._mix(int(self.pos), k, speed, g, live)); self.pos += k * speed
+            else:
+                off = min(xf - 1, int((self.pos - s0) / speed)); k = min(left, xf - off)
+                parts.append(np.tensordot(g[live], seam[live, off:off + k], axes=1) if live else np.zeros((k, CHANNELS), np.float32))
+                self.pos += k * speed
+                # Float rounding at speed != 1 can end a block on B with the seam one frame short: that is a wrap too
+                if off + k >= xf or self.pos >= loop[1]: self.pos = loop[0]; self.wraps += 1
+            left -= k
+        out = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        self.timeline.append((self.out_frames, n, segs, speed, time.monotonic())); self.out_frames += n
+        return np.clip(out, -32768, 32767).astype(np.int16)
+
+    def pull(self):
+        if not self.playing: return None
+        with self.lock:
+            if self.pos >= self.frames: return None
+            # A track still decoding holds the stream until the block under the playhead is there
+            if not all(t.ready(int(self.pos), int(self.block * self.speed) + 1) for t in self.tracks if t is not None): return None
+            return self._render(self.block)
+
+
+class NullOutput:
+    # Headless backend: no sound card needed, blocks are only counted (or paced in real time)
+    buffer = 0
+
+    def __init__(self, realtime=False):
+        self.realtime = realtime; self.blocks = 0; self.frames = 0; self.pull = None
+        self.submitted = 0; self.underruns = 0; self.t0 = None
+
+    def start(self, pull):
+        self.pull = pull
+        if self.realtime: threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            n = self.pump()
+            time.sleep((n or BLOCK) / SR)
+
+    def pump(self, blocks=1):
+        n = 0
+        for _ in range(blocks):
+            out = self.pull()
+            if out is None: break
+            if self.submitted == 0: self.t0 = time.monotonic()
+            self.blocks += 1; self.frames += len(out); self.submitted += len(out); n += len(out)
+        return n
+
+    # A block counts as heard the moment it is pulled
+    def played_frames(self): return self.submitted
+    def started(self, frame): return self.t0
+    def resume(self): pass
+    def flush(self): self.submitted = 0; self.t0 = None
+
+
+class PygameOutput:
+    # One reserved pygame channel fed by a thread: one block playing, one queued.
+    # Audio clock: queued blocks play back to back, so frames heard = anchor frame + elapsed time since the
+    # anchor block started, capped at what was handed over. Only a play() after an empty channel re-anchors.
+    def __init__(self, channel=0, buffer=512):
+        self.channel = channel; self.buffer = buffer; self.pull = None; self.wake = threading.Event()
+        self.lock = threading.Lock(); self.submitted = 0; self.anchor = None; self.underruns = 0
+
+    def start(self, pull):
+        import pygame
+        self.pygame = pygame; self.pull = pull
+        pygame.mixer.set_reserved(self.channel + 1); self.ch = pygame.mixer.Channel(self.channel)
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _sound(self):
+        out = self.pull()
+        return (None, 0) if out is None else (self.pygame.mixer.Sound(buffer=out), len(out))
+
+    def _run(self):
+        while True:
+            with self.lock:
+                idle = not self.ch.get_busy()
+                if idle:
+                    snd, n = self._sound()
+                    if snd is not None:
+                        if self.anchor is not None: self.underruns += 1
+                        self.ch.play(snd); self.anchor = (time.monotonic(), self.submitted); self.submitted += n; idle = False
+                if not idle and self.ch.get_queue() is None:
+                    snd, n = self._sound()
+                    if snd is not None: self.ch.queue(snd); self.submitted += n
+            if idle: self.wake.wait(0.05); self.wake.clear()
+            else: time.sleep(BLOCK / SR / 4)
+
+    def played_frames(self):
+        a = self.anchor
+        return 0 if a is None else min(self.submitted, a[1] + (time.monotonic() - a[0]) * SR)
+
+    def started(self, frame):
+        a = self.anchor
+        return None if a is None else a[0] + (frame - a[1]) / SR
+
+    def resume(self): self.wake.set()
+    def flush(self):
+        with self.lock: self.ch.stop(); self.submitted = 0; self.anchor = None
+
+
+class ClockMonitor:
+    # Per-session clock numbers: a naive wall-clock estimate against the audio clock, render -> speaker
+    # latency and output underruns. Running sums only, a session of any length costs the same.
+    def __init__(self, mixer):
+        self.mixer = mixer; self.reset()
+
+    def reset(self):
+        self.t0 = time.monotonic(); self.ticks = 0; self.drift_sum = 0.0; self.drift_max = 0.0; self.drift_last = 0.0
+        self.lat_n = 0; self.lat_sum = 0.0; self.lat_max = 0.0; self.underruns0 = getattr(self.mixer.output, "underruns", 0)
+
+    def sample(self, est_ms):
+        # Returns the audio clock position so callers can use it directly as the playhead
+        ms = self.mixer.position_ms(); d = est_ms - ms; lat = self.mixer.latency_ms()
+        self.ticks += 1; self.drift_sum += abs(d); self.drift_max = max(self.drift_max, abs(d)); self.drift_last = d
+        if lat is not None: self.lat_n += 1; self.lat_sum += lat; self.lat_max = max(self.lat_max, lat)
+        return ms
+
+    def summary(self):
+        return {"seconds": round(time.monotonic() - self.t0, 1), "ticks": self.ticks,
+                "drift_ms_mean": round(self.drift_sum / max(1, self.ticks), 2), "drift_ms_max": round(self.drift_max, 2), "drift_ms_last": round(self.drift_last, 2),
+                "latency_ms_mean": round(self.lat_sum / max(1, self.lat_n), 2), "latency_ms_max": round(self.lat_max, 2),
+                "underruns": getattr(self.mixer.output, "underruns", 0) - self.underruns0}
@@ -0,0 +1,168 @@
+import mmap
+import struct
+import subprocess
+import threading
+import wave
+import numpy as np
+from pydub import AudioSegment
+
+# Every track is held as int16 stereo at 44.1 kHz, shape (frames, 2)
+SR = 44100
+CHANNELS = 2
+
+
+def decode(path):
+    seg = AudioSegment.from_file(str(path)).set_frame_rate(SR).set_channels(CHANNELS).set_sample_width(2)
+    return np.frombuffer(seg.raw_data, dtype=np.int16).reshape(-1, CHANNELS)
+
+
+def is_mapped(a):
+    # True when the array lives in a memory-mapped file (pageable, shared with the OS cache) rather than on the heap
+    while a is not None:
+        if isinstance(a, (np.memmap, mmap.mmap)): return True
+        a = getattr(a, "base", None)
+    return False
+
+
+def map_wav(path):
+    # A 16-bit stereo 44.1 kHz PCM WAV already is our format: map its data chunk in place, None for anything else
+    with open(path, "rb") as f:
+        head = f.read(12); fmt = None
+        if head[:4] != b"RIFF" or head[8:12] != b"WAVE": return None
+        while len(chunk := f.read(8)) == 8:
+            cid, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+            if cid == b"fmt ": fmt = struct.unpack("<HHIIHH", f.read(size + (size & 1))[:16])
+            elif cid == b"data":
+                if fmt is None or fmt[0] != 1 or fmt[1] != CHANNELS or fmt[2] != SR or fmt[5] != 16: return None
+                n = size // (2 * CHANNELS)
+                return np.memmap(path, dtype=np.int16, mode="r", offset=f.tell(), shape=(n, CHANNELS)) if n else np.zeros((0, CHANNELS), np.int16)
+            else: f.seek(size + (size & 1), 1)
+    return None
+
+
+def write_wav(path, data):
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(CHANNELS); w.setsampwidth(2); w.setframerate(SR); w.writeframes(np.ascontiguousarray(data, dtype=np.int16).tobytes())
+
+
+class PcmTrack:
+    def __init__(self, data, path=None):
+        self.data = data
+        self.path = path
+
+    @property
+    def frames(self): return len(self.data)
+
+    @property
+    def duration_ms(self): return self.frames * 1000.0 / SR
+
+    def ready(self, start, n): return True
+    def hint(self, frame): pass
+
+    def frame_at(self, ms): return max(0, min(self.frames, int(ms * SR / 1000.0)))
+
+    def view(self, start, n=None):
+        # Zero-copy slice, cost does not depend on song length or position
+        end = self.frames if n is None else min(self.frames, start + n)
+        return self.data[start:end]
+
+    def render(self, pos, n, speed=1.0):
+        # Returns up to n output frames from source frame pos and the next source position
+        if speed == 1.0: return self.view(pos, n), pos + min(n, max(0, self.frames - pos))
+        span = int(np.ceil(n * speed)) + 1; src = self.view(pos, span)
+        if len(src) < 2: return src[:0], self.frames
+        out_n = min(n, int((len(src) - 1) / speed))
+        x = np.arange(out_n) * speed; i = x.astype(np.int64); f = (x - i)[:, None]
+        out = src[i] * (1.0 - f) + src[np.minimum(i + 1, len(src) - 1)] * f
+        return out.astype(np.int16), pos + int(round(out_n * speed))
+
+
+def estimate_frames(path):
+    try:
+        from mutagen import File
+        return int(File(str(path)).info.length * SR)
+    except Exception: return SR * 600
+
+
+class StreamingPcm(PcmTrack):
+    # Grows while ffmpeg decodes into it through a pipe, so playback can start after the first block.
+    # Filled regions are tracked per FILL_BLOCK; a hint() past the decoded region restarts ffmpeg there.
+    # An MP3 seek is not sample-exact, so seams counts the regions that did not start at frame 0.
+    FILL_BLOCK = 8192
+    READ = 65536
+
+    def __init__(self, path, est_frames=None, on_complete=None):
+        est = est_frames or estimate_frames(path)
+        super().__init__(np.zeros((est + SR, CHANNELS), dtype=np.int16), path)
+        self.est = est; self.length = None; self.complete = False; self.error = None; self.on_complete = on_complete; self.seams = 0
+        self.filled = np.zeros(len(self.data) // self.FILL_BLOCK + 1, dtype=bool)
+        self.want = 0; self.restart = False; self.cv = threading.Condition()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    @property
+    def frames(self): return self.length if self.length is not None else self.est
+
+    def ready(self, start, n):
+        if self.complete or self.error: return True
+        b0 = start // self.FILL_BLOCK; b1 = (min(start + n, self.frames) - 1) // self.FILL_BLOCK + 1
+        return b1 <= b0 or bool(self.filled[b0:b1].all())
+
+    def wait(self, start, n, timeout=None):
+        with self.cv: return self.cv.wait_for(lambda: self.ready(start, n), timeout)
+
+    def hint(self, frame):
+        with self.cv:
+            self.want = frame
+            if not self.complete and not self.filled[min(len(self.filled) - 1, frame // self.FILL_BLOCK)]: self.restart = True
+
+    def _next_start(self):
+        gaps = np.flatnonzero(~self.filled[:(self.frames + self.FILL_BLOCK - 1) // self.FILL_BLOCK])
+        if len(gaps) == 0: return None
+        ahead = gaps[gaps >= self.want // self.FILL_BLOCK]
+        return int(ahead[0] if len(ahead) else gaps[0])
+
+    def _grow(self, need):
+        with self.cv:
+            data = np.zeros((max(need, len(self.data) * 2), CHANNELS), dtype=np.int16); data[:len(self.data)] = self.data
+            filled = np.zeros(len(data) // self.FILL_BLOCK + 1, dtype=bool); filled[:len(self.filled)] = self.filled
+            self.data = data; self.filled = filled
+
+    def _decode_from(self, block):
+        # One ffmpeg run from block until EOF, a restart request, or an already decoded region
+        pos = start = block * self.FILL_BLOCK; rest = b""; self.seams += block > 0
+        cmd = [AudioSegment.converter, "-v", "error", "-ss", f"{pos / SR:.6f}", "-i", str(self.path), "-f", "s16le", "-ac", str(CHANNELS), "-ar", str(SR), "-"]
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL)
+        while True:
+            raw = proc.stdout.read(self.READ)
+            if not raw:
+                proc.wait()
+                with self.cv:
+                    # A failing exit only counts when this run produced nothing; after a decoded file it is a trailing error
+                    if proc.returncode != 0 and pos == start: raise RuntimeError(f"ffmpeg exited with {proc.returncode}")
+                    # EOF: the real length is known now, blocks past it count as decoded
+                    self.length = pos; self.filled[block:] = True; self.cv.notify_all()
+                return
+            raw = rest + raw; k = len(raw) // (2 * CHANNELS); rest = raw[k * 2 * CHANNELS:]
+            if pos + k > len(self.data): self._grow(pos + k + SR * 60)
+            self.data[pos:pos + k] = np.frombuffer(raw, dtype=np.int16, count=k * CHANNELS).reshape(-1, CHANNELS)
+            with self.cv:
+                done = (pos + k) // self.FILL_BLOCK; self.filled[block:done] = True; block = max(block, done); pos += k
+                self.cv.notify_all(); stop = self.restart or (block < len(self.filled) and self.filled[block])
+            if stop: proc.kill(); proc.wait(); return
+
+    def _run(self):
+        try:
+            while True:
+                with self.cv:
+                    block = self._next_start(); self.restart = False
+                    if block is None: self.complete = True; self.cv.notify_all(); break
+                self._decode_from(block)
+        except Exception as e:
+            with self.cv: self.error = e; self.cv.notify_all()
+            return
+        if self.on_complete: self.on_complete(self)
+
+    def adopt(self, data):
+        # Swap the decode buffer (sized from an estimate, on the heap) for the cached file of the same
+        # samples once it exists; views handed out before keep the old buffer alive until they are dropped
+        if self.complete and len(data) == self.length: self.data = data
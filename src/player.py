@@ -6,13 +6,22 @@ import numpy as np
 import time
 import re
 import threading
+import multiprocessing
 import json
 import sys
 from pathlib import Path
-from pydub import AudioSegment
-from PIL import Image, ImageTk
-from mutagen.id3 import ID3, APIC
-from io import BytesIO
+from PIL import ImageTk
+from pcm import SR
+from engine import Engine
+from lyrics import Lyrics, stamp_ms
+from metadata import MetadataStore
+from cover import load_cover
+from library import Library, stem_slots
+import memory
+import export
+from songs import LoadedSong, SongCache
+from mixer import PygameOutput
+from profiler import Profiler
 
 # --- CONFIG ---
 BG_MAIN = "#020202"
@@ -20,6 +29,10 @@ BG_CARD = "#0f0f0f"
 ACCENT = "#00ff88"
 TEXT_DIM = "#aaaaaa" 
 COLORS = ["#3498db", "#e74c3c", "#f1c40f", "#9b59b6", "#2ecc71"]
+SONG_CACHE_MB = 1024
+TICK_MS = 20  # UI tick while playing; slower ticks when a frame costs more, IDLE_TICK_MS when stopped
+MAX_TICK_MS = 50
+IDLE_TICK_MS = 250
 if getattr(sys, 'frozen', False):
     # Ak bežíme ako EXE, BASE_DIR je priečinok, kde je uložený EXE súbor
     BASE_DIR = Path(sys.executable).parent
@@ -36,24 +49,33 @@ class UltimatePlayer:
 
         pygame.mixer.pre_init(44100, -16, 2, 512)
         pygame.mixer.init()
-
-        self.db_path = BASE_DIR / "database"
+        self.engine = Engine(BASE_DIR / "cache", PygameOutput(buffer=512))
+        self.mixer = self.engine.mixer; self.clock = self.engine.clock; self.assets = self.engine.assets; self.loader = self.engine.loader
+
+        self.db_path = BASE_DIR / "database"; self.meta = MetadataStore()
+        self.library = Library(self.db_path, BASE_DIR / "library.sqlite"); self.search_var = tk.StringVar()
+        self.load_gen = 0
+        self.songs = SongCache(SONG_CACHE_MB * 1024 ** 2); self.song = None; self.prefetching = None
+        # F9: per-component timings of the UI tick, seek and load latency (overlay + logs/profile.jsonl)
+        self.prof = Profiler(BASE_DIR / "logs" / "profile.jsonl", ["update_loop", "update_ui_elements", "update_lyrics_display", "draw_digital_eq", "draw_mini_scopes"],
+                             interval_ms=TICK_MS, on_window=lambda lines: self.prof_lbl.config(text="\n".join(lines)))
         
         # --- VARIABLES ---
-        self.audio_segments = [None] * 5
-        self.full_samples = [None] * 5 
+        self.tracks = [None] * 5
         self.waveform_cache = [None] * 5 
+        self.spectra = [None] * 5  # (track, SpectrumIndex), only used while the track is still loaded
+        self.view = None
         self.markers = []
         self.marker_labels = {} 
         self.marker_time_labels = {}
-        self.lyrics_data = []
+        self.lyrics = Lyrics()
         self.current_track_name = ""
         self.current_lrc_idx = -1
+        self.current_word = None
         self.current_solo_idx = None
         self.pre_solo_mutes = [False] * 5 
         self.duration_ms = 0
         self.play_pos_ms = 0.0
-        self.start_time_ref = 0 
         self.is_playing = False
         self.is_counting = False
         
@@ -69,6 +91,7 @@ class UltimatePlayer:
         self.master_vol = tk.DoubleVar(value=0.8)
         self.repeat_var = tk.BooleanVar(value=True)
         self.count_in_var = tk.BooleanVar(value=False)
+        self.snap_var = tk.BooleanVar(value=True)
         self.vols = [tk.DoubleVar(value=0.8) for _ in range(5)]
         self.mutes = [tk.BooleanVar(value=False) for _ in range(5)]
         self.track_names = [tk.StringVar(value="") for _ in range(5)]
@@ -80,17 +103,25 @@ class UltimatePlayer:
         self.option_menus = []
 
         self.eq_peaks = np.zeros(20) 
+        self.eq_heights = None; self.scope_keys = [None] * 5; self.label_texts = {}
+        self.tick_ms = TICK_MS; self.tick_cost = 0.0; self.tick_id = None
 
         self.setup_ui()
         self.refresh_list()
+        # The index is shown as it is right away; changed song folders are picked up in the background
+        threading.Thread(target=lambda: self.library.scan(lambda: self.root.after(0, self.refresh_list)), daemon=True).start()
         
         self.root.bind_all("<space>", self.handle_space)
         self.root.bind_all("m", self.handle_marker_key)
+        self.root.bind_all("z", self.handle_zoom_key)
+        self.root.bind_all("<F12>", self.memory_report)
+        self.root.bind_all("<F9>", self.toggle_profiler)
         for i in range(1, 10):
             self.root.bind_all(str(i), lambda e, num=i: self.handle_number_key(num-1))
             self.root.bind_all(f"<KP_{i}>", lambda e, num=i: self.handle_number_key(num-1))
         
         self.root.bind("<Configure>", self.on_resize_event)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         self.root.after(200, lambda: self.root.focus_force())
         self.update_loop()
 
@@ -109,6 +140,9 @@ class UltimatePlayer:
     def handle_marker_key(self, event):
         if not self.is_typing(): self.add_marker()
 
+    def handle_zoom_key(self, event):
+        if not self.is_typing(): self.zoom_to_loop()
+
     def handle_number_key(self, idx):
         if not self.is_typing(): self.jump_to_marker(idx)
 
@@ -134,6 +168,8 @@ class UltimatePlayer:
         self.side = tk.Frame(self.root, bg="#050505", width=180); self.side.pack(side=tk.LEFT, fill=tk.Y); self.side.pack_propagate(False)
         tk.Label(self.side, text="LIBRARY", fg=ACCENT, bg="#050505", font=("Arial", 10, "bold")).pack(pady=10)
         self.cover_canvas = tk.Canvas(self.side, bg="#000", width=110, height=110, highlightthickness=1, highlightbackground="#111"); self.cover_canvas.pack(pady=5)
+        tk.Entry(self.side, textvariable=self.search_var, bg="#111", fg="#ccc", insertbackground="white", borderwidth=0, font=("Arial", 9)).pack(fill=tk.X, padx=5)
+        self.search_var.trace_add("write", lambda *a: self.refresh_list())
         self.listbox = tk.Listbox(self.side, bg="#050505", fg="#888", borderwidth=0, selectbackground="#222", font=("Arial", 9))
         self.listbox.pack(fill=tk.BOTH, expand=True, padx=5, pady=10)
         self.listbox.bind("<<ListboxSelect>>", self.on_select)
@@ -156,9 +192,13 @@ class UltimatePlayer:
         tk.Frame(self.timeline_f, width=369, bg=BG_MAIN).pack(side=tk.LEFT)
         self.marker_canvas = tk.Canvas(self.timeline_f, height=25, bg=BG_MAIN, highlightthickness=0)
         self.marker_canvas.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.marker_ph = self.marker_canvas.create_line(-10, 0, -10, 25, fill="white", width=2)
 
         # TRACKS
-        self.canvases, self.playheads, self.mini_scopes = [], [], []
+        # Waveform canvases are layered: one static waveform line, loop lines, marker lines ("mk") and the playhead.
+        # Only the waveform depends on the audio; everything else just moves with coords().
+        self.canvases, self.playheads, self.mini_scopes, self.scope_items = [], [], [], []
+        self.wave_lines, self.wave_keys, self.loop_lines, self.marker_items = [], [None] * 5, [], []
         for i in range(5):
             f = tk.Frame(self.main, bg=BG_CARD, pady=1); f.pack(fill=tk.X, pady=1)
             self.track_frames.append(f)
@@ -179,10 +219,16 @@ class UltimatePlayer:
             ms = tk.Canvas(f, width=60, height=35, bg="#050505", highlightthickness=0, cursor="hand2")
             ms.pack(side=tk.LEFT, padx=2); ms.bind("<Button-1>", lambda e, idx=i: self.solo_track(idx))
             ms.bind("<Button-3>", lambda e, idx=i: self.toggle_mute(idx)); self.mini_scopes.append(ms)
+            self.scope_items.append((ms.create_line(0, 0, 0, 0, fill=COLORS[i], width=1, state="hidden"), ms.create_rectangle(1, 1, 59, 34, outline="orange", state="hidden")))
             
             canv = tk.Canvas(f, height=35, bg="#000", highlightthickness=0)
             canv.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5); self.canvases.append(canv)
             canv.bind("<Button-1>", self.on_click_wave); canv.bind("<Button-3>", self.set_loop_a); canv.bind("<Control-Button-3>", self.set_loop_b)
+            canv.bind("<MouseWheel>", lambda e: self.on_wave_wheel(e, 1 if e.delta > 0 else -1)); canv.bind("<Shift-MouseWheel>", lambda e: self.scroll_view(-1 if e.delta > 0 else 1))
+            canv.bind("<Button-4>", lambda e: self.on_wave_wheel(e, 1)); canv.bind("<Button-5>", lambda e: self.on_wave_wheel(e, -1))
+            canv.bind("<Shift-Button-4>", lambda e: self.scroll_view(-1)); canv.bind("<Shift-Button-5>", lambda e: self.scroll_view(1))
+            self.wave_lines.append(canv.create_line(0, 0, 0, 0, fill=COLORS[i], width=1, state="hidden"))
+            self.loop_lines.append([canv.create_line(-10, 0, -10, 35, fill="orange", width=2) for _ in range(2)])
             self.playheads.append(canv.create_line(0, 0, 0, 35, fill="white", width=1))
 
         self.mark_frame = tk.Frame(self.main, bg=BG_CARD, height=40); self.mark_frame.pack(fill=tk.X, pady=2)
@@ -212,7 +258,9 @@ class UltimatePlayer:
         b_lb_p.bind("<ButtonPress-1>", lambda e: self.start_nudge(self.nudge_loop, 'b', 20)); b_lb_p.bind("<ButtonRelease-1>", self.stop_nudge)
         
         tk.Button(self.foot, text="RESET AB", command=self.clear_loop, bg="#332222", fg="#aaa", font=("Arial", 7), relief=tk.FLAT).pack(side=tk.LEFT, padx=10)
+        tk.Checkbutton(self.foot, text="SNAP", variable=self.snap_var, bg="#111", fg="white", selectcolor=ACCENT, indicatoron=False, padx=10, font=("Arial", 7, "bold")).pack(side=tk.LEFT, padx=5)
         tk.Checkbutton(self.foot, text="REPEAT", variable=self.repeat_var, bg="#111", fg="white", selectcolor=ACCENT, indicatoron=False, padx=10, font=("Arial", 7, "bold")).pack(side=tk.LEFT, padx=5)
+        tk.Button(self.foot, text="EXPORT", command=self.export_mix, bg="#222", fg=ACCENT, font=("Arial", 7, "bold"), relief=tk.FLAT).pack(side=tk.LEFT, padx=5)
         self.time_label = tk.Label(self.foot, text="00:00 / 00:00 / -00:00", fg="white", bg=BG_MAIN, font=("Consolas", 13)); self.time_label.pack(side=tk.RIGHT)
 
         self.mid_panel = tk.Frame(self.main, bg="#050505", height=160); self.mid_panel.pack(fill=tk.BOTH, pady=5, expand=True)
@@ -221,19 +269,21 @@ class UltimatePlayer:
         self.ly_curr = tk.Label(self.ly_synced_f, text="READY", fg=ACCENT, bg="#050505", font=("Arial", 30, "bold"), wraplength=550); self.ly_curr.place(relx=0.5, rely=0.45, anchor="center")
         self.ly_next = tk.Label(self.ly_synced_f, text="", fg="#555", bg="#050505", font=("Arial", 18, "bold"), wraplength=500); self.ly_next.place(relx=0.5, rely=0.75, anchor="center")
         self.scope_canvas = tk.Canvas(self.mid_panel, bg="#050505", height=60, highlightthickness=0); self.scope_canvas.place(relx=0, rely=0.65, relwidth=0.74, relheight=0.35)
+        self.eq_bars = [self.scope_canvas.create_rectangle(0, 0, 0, 0, fill="#1a3328", outline="") for _ in range(20)]
         
         self.ly_full_f = tk.Frame(self.mid_panel, bg="#080808"); self.ly_full_f.place(relx=0.75, rely=0, relwidth=0.25, relheight=1)
         self.ly_txt = tk.Text(self.ly_full_f, bg="#080808", fg=TEXT_DIM, font=("Arial", 11), borderwidth=0, wrap=tk.WORD, cursor="hand2", state=tk.DISABLED); self.ly_txt.pack(fill=tk.BOTH, expand=True, padx=8, pady=8)
-        self.ly_txt.tag_configure("highlight", background="#1a3328"); self.ly_txt.bind("<Button-1>", self.on_lyrics_click)
+        self.ly_txt.tag_configure("highlight", background="#1a3328"); self.ly_txt.tag_configure("word", foreground=ACCENT); self.ly_txt.bind("<Button-1>", self.on_lyrics_click)
         self.btn_edit_lyrics = tk.Button(self.ly_full_f, text="EDIT LYRICS", command=self.toggle_lyrics_edit, bg="#222", fg=ACCENT, font=("Arial", 8, "bold"), borderwidth=1, relief=tk.FLAT); self.btn_edit_lyrics.pack(fill=tk.X, padx=8, pady=(0,8))
 
+        self.prof_lbl = tk.Label(self.root, text="", fg=ACCENT, bg="#000", font=("Consolas", 8), justify=tk.LEFT, anchor="nw")
         self.load_ovl = tk.Frame(self.root, bg="#000"); self.load_lbl = tk.Label(self.load_ovl, text="LOADING...", fg=ACCENT, bg="#000", font=("Impact", 40)); self.load_lbl.place(relx=0.5, rely=0.5, anchor="center")
 
     def on_click_wave(self, event):
         if self.duration_ms > 0:
-            target = (event.x / event.widget.winfo_width()) * self.duration_ms; self.play_pos_ms = float(target)
+            target = self.x_to_ms(event.x, event.widget.winfo_width()); self.play_pos_ms = float(target)
             if self.is_playing: self.play_from(target, ignore_count_in=True)
-            else: self.update_ui_elements(); self.draw_all_waves(); self.update_lyrics_display()
+            else: self.update_ui_elements(); self.update_lyrics_display()
         self.root.focus_force()
 
     def on_select(self, event):
@@ -244,51 +294,110 @@ class UltimatePlayer:
             if res is True: self.toggle_lyrics_edit() 
             elif res is False: self.force_close_editor()
             else: return 
+        name = self.listbox.get(idx); self.load_gen += 1; song = self.cached_song(name)
+        if song is not None:
+            lt = self.prof.load(name); self._show_song(song, self.load_gen, lt)
+            if lt: lt.done()
+            return
         self.load_ovl.place(relx=0, rely=0, relwidth=1, relheight=1); self.load_ovl.lift(); self.root.update()
-        name = self.listbox.get(idx); threading.Thread(target=self._load_thread, args=(name,), daemon=True).start()
+        threading.Thread(target=self._load_thread, args=(name, self.load_gen), daemon=True).start()
 
     def force_close_editor(self):
         self.is_lyrics_editing = False; self.ly_synced_f.place_configure(relwidth=0.74); self.ly_full_f.place_configure(relwidth=0.25, relx=0.75)
         self.ly_txt.config(state=tk.DISABLED, bg="#080808", fg=TEXT_DIM); self.btn_edit_lyrics.config(text="EDIT LYRICS", bg="#222", fg=ACCENT)
         self.ly_txt.unbind("<Control-Key-t>"); self.ly_txt.unbind("<Control-Key-T>")
 
-    def _load_thread(self, name):
-        pygame.mixer.stop(); t_dir = self.db_path / name; stems_dir = t_dir / "stems"
-        stems_found = sorted([f.name for f in stems_dir.glob("*.mp3")]) if stems_dir.exists() else []
-        self.root.after(0, lambda: self._update_stem_menus(["NONE"] + stems_found))
-        
-        orig = next(t_dir.glob("*.mp3"), None); lrc = next(t_dir.glob("*.lrc"), Path("none"))
-        meta_p = t_dir / "metadata.json"; saved_mappings = ["NONE"] * 5
-        if meta_p.exists():
-            with open(meta_p, "r", encoding="utf-8") as f:
-                data = json.load(f); raw_paths = data.get("track_mappings", ["NONE"]*5)
-                for i, rp in enumerate(raw_paths):
-                    if rp != "NONE": saved_mappings[i] = Path(rp).name
-
-        final_mappings = ["NONE"] * 5; final_mappings[0] = orig.name if orig else "NONE"
-        available_stems = list(stems_found); keywords = ["drum", "bass", "other", "vocal"]
-        
-        for i in range(1, 5):
-            if saved_mappings[i] != "NONE" and saved_mappings[i] in available_stems:
-                final_mappings[i] = saved_mappings[i]; available_stems.remove(saved_mappings[i])
-            else:
-                kw = keywords[i-1]; found = next((s for s in available_stems if kw in s.lower()), None)
-                if found: final_mappings[i] = found; available_stems.remove(found)
+    def _resolve(self, name):
+        # File layout from the library index, stem slots from saved mappings or keywords
+        t_dir = self.db_path / name; stems_dir = t_dir / "stems"
+        info = self.library.song(name) or {"stems": [], "original": None, "lyrics": None}
+        stems_found = info["stems"]
+        orig = t_dir / info["original"] if info["original"] else None; lrc = t_dir / info["lyrics"] if info["lyrics"] else Path("none")
+        saved_mappings = ["NONE"] * 5
+        for i, rp in enumerate(self.meta.read(t_dir / "metadata.json").get("track_mappings", ["NONE"]*5)):
+            if rp != "NONE" and i < 5: saved_mappings[i] = Path(rp).name
+
+        final_mappings = [orig.name if orig else "NONE"] + stem_slots(stems_found, saved_mappings[1:])
+        paths = [orig] + [(stems_dir / f if f != "NONE" else None) for f in final_mappings[1:]]
+        return LoadedSong(name, (info["original"], tuple(stems_found), info["lyrics"]), paths, final_mappings, stems_found, lrc, orig)
+
+    def _fill(self, song, on_track=None, is_current=lambda: True):
+        # Decodes into song; a song loaded to the end goes into the LRU cache
+        song.cover = self.cover_image(song.orig)
+        self.engine.fill(song, on_track, is_current, lambda tr: self.root.after(0, lambda: self._track_complete(song, tr)))
+        if song.complete: self.songs.put(song, keep=self.current_track_name)
+
+    def _load_thread(self, name, gen):
+        # Original first (waveform + playable), stems join the mix as their decode finishes
+        lt = self.prof.load(name); self.stop_streams(); pre = self.prefetching
+        if pre is not None and pre[0] == name:
+            # This song is being prefetched: wait for that fill instead of decoding the same files a second time
+            pre[1].wait()
+            if gen != self.load_gen: return
+            song = self.cached_song(name)
+            if song is not None:
+                self.root.after(0, lambda: self._show_song(song, gen, lt))
+                if lt: lt.done()
+                return
+        song = self._resolve(name)
+        if lt: lt.mark("resolve")
+        def on_track(i):
+            if lt: lt.mark(f"track {i}")
+            if i == 0: self.root.after(0, lambda: self._show_song(song, gen, lt))
+            else: self.root.after(0, lambda: self._attach_track(song, i))
+        try: self._fill(song, on_track, lambda: gen == self.load_gen)
+        except Exception as e: print(f"❌ Load failed: {name} ({e})"); self.root.after(0, self.load_ovl.place_forget)
+        if lt: lt.done(song.complete)
+
+    def cached_song(self, name):
+        # A cached song is only reused while its files are the same ones it was loaded from
+        song = self.songs.get(name)
+        if song is None or not song.complete: return None
+        info = self.library.song(name)
+        if info is None or (info["original"], tuple(info["stems"]), info["lyrics"]) != song.layout: self.songs.drop(name); return None
+        return song
+
+    def prefetch_next(self):
+        # The song below the selection loads in the background, so stepping down the list is a cache hit
+        sel = self.listbox.curselection()
+        if not sel or sel[0] + 1 >= self.listbox.size() or self.prefetching: return
+        name = self.listbox.get(sel[0] + 1)
+        if self.songs.get(name) is not None: return
+        # (name, done): a load of the same song waits for done instead of starting a second fill
+        done = threading.Event(); self.prefetching = (name, done)
+        def run():
+            try: self._fill(self._resolve(name))
+            except Exception as e: print(f"❌ Prefetch failed: {name} ({e})")
+            finally: self.prefetching = None; done.set()
+        threading.Thread(target=run, daemon=True).start()
+
+    # --- WAVEFORM VIEW (zoom / scroll) ---
+    def view_range(self): return self.view if self.view else (0.0, float(self.duration_ms))
+
+    def ms_to_x(self, ms, w):
+        s, e = self.view_range(); return (ms - s) / (e - s) * w if e > s else 0
+
+    def x_to_ms(self, x, w):
+        s, e = self.view_range(); return max(0.0, min(float(self.duration_ms), s + (x / max(1, w)) * (e - s)))
+
+    def set_view(self, start, length):
+        if self.duration_ms <= 0: return
+        length = max(500.0, min(float(self.duration_ms), length)); start = max(0.0, min(self.duration_ms - length, start))
+        self.view = None if length >= self.duration_ms else (start, start + length); self.draw_all_waves()
 
-        for i in range(1, 5):
-            if final_mappings[i] == "NONE" and available_stems: final_mappings[i] = available_stems.pop(0)
+    def on_wave_wheel(self, event, direction):
+        # Zoom around the cursor, 1.5x per wheel step
+        if self.duration_ms <= 0: return
+        s, e = self.view_range(); at = self.x_to_ms(event.x, event.widget.winfo_width()); f = 1 / 1.5 if direction > 0 else 1.5
+        self.set_view(at - (at - s) * f, (e - s) * f)
 
-        new_audio = [None] * 5; new_waves = [None] * 5; new_full = [None] * 5; dur = 0
-        paths = [orig] + [(stems_dir / f if f != "NONE" else None) for f in final_mappings[1:]]
-        
-        for i, p in enumerate(paths):
-            if p and p.exists():
-                seg = AudioSegment.from_file(str(p)).set_frame_rate(44100)
-                new_audio[i] = seg; new_full[i] = np.array(seg.get_array_of_samples())
-                if i == 0: dur = len(seg)
-                smp = new_full[i]; step = max(1, len(smp)//3000); new_waves[i] = smp[::step].astype(float) / (np.max(np.abs(smp)) if len(smp)>0 else 1)
-        
-        self.root.after(0, lambda: self._finalize_load(name, new_audio, new_waves, new_full, dur, lrc, orig, final_mappings))
+    def scroll_view(self, direction):
+        s, e = self.view_range(); self.set_view(s + direction * (e - s) * 0.25, e - s)
+
+    def zoom_to_loop(self):
+        if self.view: self.set_view(0, self.duration_ms)
+        elif self.loop_a is not None and self.loop_b is not None:
+            a, b = sorted((self.loop_a, self.loop_b)); pad = max(250.0, (b - a) * 0.15); self.set_view(a - pad, b - a + 2 * pad)
 
     def _update_stem_menus(self, options):
         self.stem_options = options
@@ -296,165 +405,273 @@ class UltimatePlayer:
             menu = om["menu"]; menu.delete(0, "end")
             for o in options: menu.add_command(label=o, command=tk._setit(var, o, lambda v, idx=self.option_menus.index(om)+1: self.on_stem_change(idx, v)))
 
-    def _finalize_load(self, name, audio, waves, full, dur, lrc, orig, mappings):
-        self.is_playing = False; pygame.mixer.stop(); self.play_pos_ms = 0.0; self.playback_speed.set(1.0); self.is_counting = False; self.count_in_var.set(False)
-        self.loop_a = None; self.loop_b = None; self.btn_play.config(text=" ▶ PLAY ", bg=ACCENT)
-        self.current_track_name = name; self.audio_segments = audio; self.waveform_cache = waves; self.full_samples = full; self.duration_ms = dur
-        for i, m in enumerate(mappings): self.track_mappings[i].set(m)
-        self.load_metadata(name); self.load_lyrics_data(lrc); self.save_metadata()
-        if orig: self.load_cover(orig); self.draw_all_waves(); self.refresh_marker_ui(); self.update_ui_elements(); self.load_ovl.place_forget()
-        self.root.focus_force()
+    def _show_song(self, song, gen, lt=None):
+        if gen != self.load_gen: return
+        self.log_clock(); self.meta.flush(); self.song = song; track = song.tracks[0]
+        self.is_playing = False; self.stop_streams(); self.play_pos_ms = 0.0; self.playback_speed.set(1.0); self.is_counting = False; self.count_in_var.set(False)
+        self.loop_a = None; self.loop_b = None; self.view = None; self.btn_play.config(text=" ▶ PLAY ", bg=ACCENT)
+        self._update_stem_menus(["NONE"] + song.stems)
+        # The player works on the song's own lists, stem changes and late spectra land in the cache entry too
+        self.current_track_name = song.name; self.tracks = song.tracks; self.engine.set_song(song); self.waveform_cache = song.peaks; self.spectra = song.spectra
+        self.duration_ms = track.duration_ms if track else 0
+        for i, m in enumerate(song.mappings): self.track_mappings[i].set(m)
+        self.load_metadata(song.name); self.load_lyrics_data(song.lrc, song.lyrics); self.save_metadata()
+        self.show_cover(song.cover); self.draw_all_waves(); self.refresh_marker_ui(); self.update_ui_elements(); self.load_ovl.place_forget()
+        self.root.focus_force(); self.prefetch_next()
+        if lt: lt.mark("shown")
+
+    def _attach_track(self, song, idx):
+        if song is not self.song: return
+        self.engine.set_track(idx, song.tracks[idx]); self.draw_waves()
+
+    def _track_complete(self, song, track):
+        # A streamed track finished decoding: real length and full waveform are known now
+        idx = self.engine.complete_track(song, track)
+        if idx is None or song is not self.song: return
+        if idx == 0: self.duration_ms = track.duration_ms
+        self.draw_waves(); self.update_ui_elements()
 
     def on_stem_change(self, idx, filename):
         if filename == "NONE":
-            self.audio_segments[idx] = None; self.waveform_cache[idx] = None; self.full_samples[idx] = None
-            self.draw_all_waves(); self.save_metadata()
-            if self.is_playing: self.play_from(self.play_pos_ms, ignore_count_in=True)
+            self.tracks[idx] = None; self.engine.set_track(idx, None); self.waveform_cache[idx] = None; self.spectra[idx] = None
+            if self.song: self.song.mappings[idx] = filename
+            self.draw_waves(); self.save_metadata()
         else:
             threading.Thread(target=self._reload_single_stem, args=(idx, filename), daemon=True).start()
 
     def _reload_single_stem(self, idx, filename):
         p = self.db_path / self.current_track_name / "stems" / filename
         if p.exists():
-            seg = AudioSegment.from_file(str(p)).set_frame_rate(44100)
-            self.audio_segments[idx] = seg; self.full_samples[idx] = np.array(seg.get_array_of_samples())
-            smp = self.full_samples[idx]; step = max(1, len(smp)//3000)
-            self.waveform_cache[idx] = smp[::step].astype(float) / (np.max(np.abs(smp)) if len(smp)>0 else 1)
-            self.root.after(0, self.draw_all_waves); self.root.after(0, lambda: self.update_mix(idx)); self.save_metadata()
-            if self.is_playing: self.root.after(0, lambda: self.play_from(self.play_pos_ms, ignore_count_in=True))
+            self.tracks[idx] = self.loader.track(p)
+            if self.song: self.song.mappings[idx] = filename; self.engine.complete_track(self.song, self.tracks[idx])
+            self.engine.set_track(idx, self.tracks[idx]); self.prepare_speed()
+            self.root.after(0, self.draw_waves); self.root.after(0, lambda: self.update_mix(idx)); self.save_metadata()
 
     def toggle(self):
         if self.duration_ms > 0:
-            if self.is_playing: self.is_playing = False; pygame.mixer.stop(); self.btn_play.config(text=" ▶ PLAY ", bg=ACCENT)
+            if self.is_playing: self.is_playing = False; self.stop_streams(); self.btn_play.config(text=" ▶ PLAY ", bg=ACCENT)
             elif not self.is_counting: self.play_from(self.play_pos_ms)
 
     def play_from(self, ms, ignore_count_in=False):
-        pygame.mixer.stop(); ms = float(max(0, ms)); self.play_pos_ms = ms
+        t0 = time.monotonic(); self.stop_streams(); ms = float(max(0, ms)); self.play_pos_ms = ms
         if not ignore_count_in and self.count_in_var.get():
             threading.Thread(target=self._run_count_in, args=(ms,), daemon=True).start()
-        else: self._start_audio_logic(ms)
+        else:
+            self._start_audio_logic(ms)
+            if self.prof.on: self.prof.seek_started(t0, lambda: self.mixer.output.started(0))
 
     def _run_count_in(self, target_ms):
-        self.is_counting = True; clk = self.create_beep(1000, 70)
+        # Clicks at the song's tempo (as heard at the current speed) once its beat grid is known
+        self.is_counting = True; clk = self.create_beep(1000, 70); beats = self.song.beats if self.song else None
+        gap = beats.period_ms / 1000.0 / self.playback_speed.get() if beats is not None and beats.bpm else 0.6
         for i in range(4):
             if not self.is_counting: return
             self.root.after(0, lambda x=4-i: self.ly_curr.config(text=f"COUNT: {x}", fg="orange"))
-            clk.play(); time.sleep(0.6)
+            clk.play(); time.sleep(gap)
         self.is_counting = False; self.root.after(0, lambda: self._start_audio_logic(target_ms))
 
     def _start_audio_logic(self, ms):
-        speed = self.playback_speed.get(); prep = []
-        for i, seg in enumerate(self.audio_segments):
-            if seg:
-                shifted = seg._spawn(seg.raw_data, overrides={'frame_rate': int(seg.frame_rate * speed)}).set_frame_rate(44100)
-                idx = int(ms / speed); prep.append((i, pygame.mixer.Sound(buffer=shifted[idx:].raw_data)))
-        self.start_time_ref = time.time() - (ms / (1000.0 * speed))
-        for idx, snd in prep: pygame.mixer.Channel(idx).play(snd); self.update_mix(idx)
-        self.is_playing = True; self.btn_play.config(text=" ⏸ PAUSE ", bg="#ffcc00")
+        self.update_all_mixes(); self.engine.start(ms, self.playback_speed.get())
+        self.is_playing = True; self.btn_play.config(text=" ⏸ PAUSE ", bg="#ffcc00"); self.wake()
+
+    def stop_streams(self): self.engine.stop(); pygame.mixer.stop()
 
     def stop_logic(self):
         now = time.time(); self.play_pos_ms = 0.0 if now - self.last_stop_click_time < 0.5 else self.play_pos_ms
-        self.is_playing = False; self.is_counting = False; pygame.mixer.stop()
+        self.is_playing = False; self.is_counting = False; self.stop_streams()
         self.btn_play.config(text=" ▶ PLAY ", bg=ACCENT); self.last_stop_click_time = now
-        self.update_ui_elements(); self.draw_all_waves()
+        self.update_ui_elements()
 
     def change_speed(self, delta):
         new_speed = round(max(0.5, min(2.0, self.playback_speed.get() + delta)), 1); self.playback_speed.set(new_speed)
         if self.is_playing: self.play_from(self.play_pos_ms, ignore_count_in=True)
+        else: self.prepare_speed()
+
+    def prepare_speed(self, ms=None):
+        ms = self.play_pos_ms if ms is None else ms
+        self.engine.prepare_speed(ms, self.playback_speed.get())
 
     def seek(self, ms_delta):
         target = max(0, min(self.duration_ms, self.play_pos_ms + ms_delta)); self.play_pos_ms = target
         if self.is_playing: self.play_from(target, ignore_count_in=True)
-        else: self.update_ui_elements(); self.draw_all_waves(); self.update_lyrics_display()
+        else: self.update_ui_elements(); self.update_lyrics_display()
 
     def nudge_loop(self, type, delta):
         if type == 'a' and self.loop_a is not None: self.loop_a = max(0, self.loop_a + delta)
         elif type == 'b' and self.loop_b is not None: self.loop_b = min(self.duration_ms, self.loop_b + delta)
-        self.save_metadata(); self.draw_all_waves(); self.update_ui_elements()
+        self.sync_loop(); self.save_metadata(); self.draw_loop(); self.update_ui_elements()
 
     def nudge_marker(self, idx, delta):
         old_ms = self.markers[idx]; new_ms = max(0, min(self.duration_ms, old_ms + delta))
         if old_ms in self.marker_labels: self.marker_labels[new_ms] = self.marker_labels.pop(old_ms)
-        self.markers[idx] = new_ms; self.save_metadata(); self.draw_all_waves()
+        self.markers[idx] = new_ms; self.save_metadata(); self.move_marker(idx)
         if idx in self.marker_time_labels: self.marker_time_labels[idx].config(text=self.format_ms(new_ms))
 
-    def clear_loop(self): self.loop_a = None; self.loop_b = None; self.save_metadata(); self.draw_all_waves(); self.update_ui_elements()
+    def clear_loop(self): self.loop_a = None; self.loop_b = None; self.sync_loop(); self.save_metadata(); self.draw_loop(); self.update_ui_elements()
+
+    def snap(self, ms):
+        # Nearest beat of the current song with SNAP on; unchanged while the grid is still being built
+        beats = self.song.beats if self.song else None
+        return beats.snap(ms) if beats is not None and self.snap_var.get() else ms
 
     def set_loop_a(self, event):
-        self.loop_a = (event.x / event.widget.winfo_width()) * self.duration_ms; self.save_metadata(); self.draw_all_waves(); self.update_ui_elements()
+        self.loop_a = self.snap(self.x_to_ms(event.x, event.widget.winfo_width())); self.sync_loop(); self.save_metadata(); self.draw_loop(); self.update_ui_elements()
 
     def set_loop_b(self, event):
-        self.loop_b = (event.x / event.widget.winfo_width()) * self.duration_ms; self.save_metadata(); self.draw_all_waves(); self.update_ui_elements()
+        self.loop_b = self.snap(self.x_to_ms(event.x, event.widget.winfo_width())); self.sync_loop(); self.save_metadata(); self.draw_loop(); self.update_ui_elements()
+
+    def sync_loop(self): self.engine.set_loop(self.loop_a, self.loop_b)
 
     def update_loop(self):
+        t0 = time.perf_counter()
         if self.is_playing:
-            speed = self.playback_speed.get(); self.play_pos_ms = (time.time() - self.start_time_ref) * 1000.0 * speed
-            if self.loop_a is not None and self.loop_b is not None:
-                if self.loop_a <= self.play_pos_ms >= self.loop_b:
-                    if self.play_pos_ms < self.loop_b + 200: self.play_from(self.loop_a, ignore_count_in=True)
+            self.play_pos_ms = self.engine.position()
             if self.play_pos_ms >= self.duration_ms:
                 if self.repeat_var.get(): self.play_from(0, ignore_count_in=True)
-                else: self.stop_logic(); self.play_pos_ms = 0.0; self.update_ui_elements(); self.draw_all_waves()
+                else: self.stop_logic(); self.play_pos_ms = 0.0; self.update_ui_elements()
             self.update_ui_elements(); self.update_lyrics_display()
-        self.draw_digital_eq(); self.draw_mini_scopes(); self.root.after(20, self.update_loop)
+        moving = self.draw_digital_eq(); self.draw_mini_scopes()
+        # Adaptive rate: while playing (or the EQ is still falling) a tick may take a quarter of its interval,
+        # a slow machine gets fewer frames instead of a backlog; stopped, it idles until wake()
+        self.tick_cost = 0.9 * self.tick_cost + 0.1 * (time.perf_counter() - t0) * 1000.0
+        self.tick_ms = int(min(MAX_TICK_MS, max(TICK_MS, self.tick_cost * 4))) if self.is_playing or moving else IDLE_TICK_MS
+        self.prof.interval_ms = self.tick_ms; self.tick_id = self.root.after(self.tick_ms, self.update_loop)
+
+    def wake(self):
+        # Something changed while idle: next tick now instead of up to IDLE_TICK_MS later
+        if self.tick_ms == IDLE_TICK_MS and self.tick_id is not None:
+            self.root.after_cancel(self.tick_id); self.tick_ms = TICK_MS; self.tick_id = self.root.after(0, self.update_loop)
+
+    def log_clock(self):
+        # One JSON line per song session: audio clock vs wall-clock drift, output latency, underruns
+        if self.clock.ticks and self.current_track_name:
+            entry = {"song": self.current_track_name, "time": time.strftime("%Y-%m-%d %H:%M:%S"), **self.clock.summary()}
+            try:
+                (BASE_DIR / "logs").mkdir(exist_ok=True)
+                with open(BASE_DIR / "logs" / "clock.jsonl", "a", encoding="utf-8") as f: f.write(json.dumps(entry) + "\n")
+            except OSError: pass
+        self.clock.reset()
+
+    def export_mix(self):
+        # The mix as heard (slots, volumes, mutes, master, speed) to WAV/MP3; with A-B set, the loop repeated N times
+        if self.duration_ms <= 0: return
+        path = filedialog.asksaveasfilename(defaultextension=".wav", initialfile=f"{self.current_track_name}.wav", filetypes=[("WAV", "*.wav"), ("MP3", "*.mp3")])
+        if not path: return
+        loop = None; repeats = 1
+        if self.loop_a is not None and self.loop_b is not None:
+            repeats = simpledialog.askinteger("Export", "Repeat the A-B loop how many times? (0 = whole song)", initialvalue=8, minvalue=0, maxvalue=999)
+            if repeats is None: return
+            if repeats: loop = tuple(sorted((self.loop_a, self.loop_b)))
+            repeats = max(1, repeats)
+        args = (list(self.tracks), path, [v.get() for v in self.vols], [m.get() for m in self.mutes], self.master_vol.get(), self.playback_speed.get(), loop, repeats)
+        def run():
+            try: frames, secs = export.mixdown(*args); msg = f"{Path(path).name}: {frames / SR:.1f} s rendered in {secs:.1f} s"
+            except Exception as e: msg = f"Export failed: {e}"
+            print(f"💾 {msg}"); self.root.after(0, lambda: messagebox.showinfo("StemQuina Export", msg))
+        threading.Thread(target=run, daemon=True).start()
+
+    def toggle_profiler(self, event=None):
+        if self.prof.toggle(self):
+            self.prof_lbl.config(text="profiling..."); self.prof_lbl.place(relx=1.0, rely=0, anchor="ne"); self.prof_lbl.lift()
+        else: self.prof_lbl.place_forget()
+
+    def memory_report(self, event=None):
+        print("\n".join(memory.report(self.tracks, [m.get() for m in self.track_mappings], self.waveform_cache, self.spectra, self.mixer.stretch, self.assets, self.songs)))
+
+    def on_close(self):
+        self.log_clock(); self.prof.disable(); self.meta.flush(); self.stop_streams(); self.engine.shutdown(); self.root.destroy()
 
     def draw_digital_eq(self):
-        self.scope_canvas.delete("all"); w_b, h_b = self.scope_canvas.winfo_width(), self.scope_canvas.winfo_height()
-        if w_b < 10: return
+        # The 20 bars exist once and are moved with coords(), only those whose pixel height changed.
+        # Returns True while any bar is still up, so the tick keeps its rate until they have fallen.
+        w_b, h_b = self.scope_canvas.winfo_width(), self.scope_canvas.winfo_height()
+        if w_b < 10: return False
         self.eq_peaks *= 0.92 
-        if self.is_playing and self.full_samples[0] is not None:
-            idx = int((self.play_pos_ms / 1000.0) * 44100); chunk = 2048
-            if idx + chunk < len(self.full_samples[0]):
-                fft_res = np.abs(np.fft.rfft(self.full_samples[0][idx : idx + chunk]))[:chunk//2]
-                new_vals = [ (np.mean(b)**1.4) * 0.4 for b in np.array_split(np.log10(fft_res + 1), 20)]
-                self.eq_peaks = np.maximum(self.eq_peaks, new_vals)
-        bw = (w_b / 20) - 2
-        for i, v in enumerate(self.eq_peaks):
-            h = min(h_b, v * h_b * 0.4); self.scope_canvas.create_rectangle(i*(w_b/20)+1, h_b-h, i*(w_b/20)+1+bw, h_b, fill="#1a3328", outline="")
+        bands = self.engine.bands(self.play_pos_ms) if self.is_playing else None
+        if bands is not None: self.eq_peaks = np.maximum(self.eq_peaks, (bands.astype(np.float32).mean(axis=0) ** 1.4) * 0.4)
+        hs = np.minimum(h_b, self.eq_peaks * h_b * 0.4).astype(int); bw = w_b / 20
+        old = self.eq_heights
+        changed = range(20) if old is None or old[0] != (w_b, h_b) else np.flatnonzero(hs != old[1])
+        for i in changed: self.scope_canvas.coords(self.eq_bars[i], i*bw+1, h_b-hs[i], i*bw+bw-1, h_b)
+        self.eq_heights = ((w_b, h_b), hs)
+        return bool(hs.any())
 
     def draw_mini_scopes(self):
+        # One line and one solo frame per scope, created once; a scope is redrawn only when its picture would change
+        w, h = 60, 35; f = int(self.play_pos_ms * SR / 1000)
         for i, ms in enumerate(self.mini_scopes):
-            ms.delete("all"); w, h = 60, 35
-            if self.waveform_cache[i] is not None and self.duration_ms > 0:
-                idx = int((self.play_pos_ms / self.duration_ms) * len(self.waveform_cache[i]))
-                chunk = self.waveform_cache[i][max(0, idx-20):idx+20]
-                if len(chunk) > 1:
-                    pts = []
-                    for x, v in enumerate(chunk): pts.extend([x*(w/len(chunk)), h/2-(v*h/2*self.vols[i].get())])
-                    ms.create_line(pts, fill=COLORS[i] if not self.mutes[i].get() else "#333", width=1)
-            if self.current_solo_idx == i: ms.create_rectangle(1,1,w-1,h-1,outline="orange")
+            pyr = self.waveform_cache[i] if self.duration_ms > 0 else None; vol = self.vols[i].get(); muted = self.mutes[i].get()
+            key = (pyr, f if pyr is not None else None, vol, muted, self.current_solo_idx == i)
+            if key == self.scope_keys[i]: continue
+            self.scope_keys[i] = key; line, frame = self.scope_items[i]
+            if pyr is not None:
+                mn, mx, _ = pyr.columns(f - SR, f + SR, 40)
+                ys = h/2 - np.where(np.arange(40) % 2 == 0, mx, mn) * (h/2 * vol / (pyr.peak or 1))
+                ms.coords(line, *np.column_stack((np.arange(40) * (w / 40), ys)).ravel().tolist())
+                ms.itemconfig(line, fill=COLORS[i] if not muted else "#333", state="normal")
+            else: ms.itemconfig(line, state="hidden")
+            ms.itemconfig(frame, state="normal" if self.current_solo_idx == i else "hidden")
 
     def update_ui_elements(self):
         if self.duration_ms <= 0: return
-        self.lbl_a.config(text=self.format_ms(self.loop_a)); self.lbl_b.config(text=self.format_ms(self.loop_b))
+        if self.view and self.is_playing and self.play_pos_ms < self.duration_ms and not (self.view[0] <= self.play_pos_ms < self.view[1]):
+            # Zoomed in: page the view along with the playhead
+            self.set_view(self.play_pos_ms, self.view[1] - self.view[0]); return
+        self.set_text(self.lbl_a, self.format_ms(self.loop_a)); self.set_text(self.lbl_b, self.format_ms(self.loop_b))
         for i, canv in enumerate(self.canvases):
-            x = (self.play_pos_ms / self.duration_ms) * canv.winfo_width(); canv.coords(self.playheads[i], x, 0, x, 35)
+            x = self.ms_to_x(self.play_pos_ms, canv.winfo_width()); canv.coords(self.playheads[i], x, 0, x, 35)
         tw = self.marker_canvas.winfo_width()
         if tw > 1:
-            tx = (self.play_pos_ms / self.duration_ms) * tw
-            self.marker_canvas.delete("ph"); self.marker_canvas.create_line(tx, 0, tx, 25, fill="white", width=2, tags="ph")
+            tx = self.ms_to_x(self.play_pos_ms, tw)
+            self.marker_canvas.coords(self.marker_ph, tx, 0, tx, 25)
         c, t = int(self.play_pos_ms//1000), int(self.duration_ms//1000); rem = max(0, t - c)
-        self.time_label.config(text=f"{c//60:02}:{c%60:02} / {t//60:02}:{t%60:02} / -{rem//60:02}:{rem%60:02}")
+        self.set_text(self.time_label, f"{c//60:02}:{c%60:02} / {t//60:02}:{t%60:02} / -{rem//60:02}:{rem%60:02}")
+
+    def set_text(self, label, text):
+        # Label text is only handed to Tk when it changed (it would relayout the label every tick otherwise)
+        if self.label_texts.get(label) != text: self.label_texts[label] = text; label.config(text=text)
+
+    def wave_width(self): w = self.canvases[0].winfo_width(); return 800 if w < 10 else w
 
     def draw_all_waves(self):
-        w = self.canvases[0].winfo_width(); w = 800 if w < 10 else w; self.marker_canvas.delete("all")
-        for i in range(5):
-            canv = self.canvases[i]; canv.delete("all")
-            if self.waveform_cache[i] is not None:
-                idx = np.linspace(0, len(self.waveform_cache[i])-1, w).astype(int)
-                coords = []; [coords.extend([x, 17-(v*15), x, 17+(v*15)]) for x, v in enumerate(self.waveform_cache[i][idx])]
-                canv.create_line(coords, fill=COLORS[i], width=1)
-            if self.loop_a: ax=(self.loop_a/self.duration_ms)*w if self.duration_ms > 0 else 0; canv.create_line(ax,0,ax,35,fill="orange",width=2)
-            if self.loop_b: bx=(self.loop_b/self.duration_ms)*w if self.duration_ms > 0 else 0; canv.create_line(bx,0,bx,35,fill="orange",width=2)
-            for m in self.markers: 
-                mx=(m/self.duration_ms)*w if self.duration_ms > 0 else 0; canv.create_line(mx,0,mx,35,fill="#333",width=1)
-            if self.duration_ms > 0:
-                px=(self.play_pos_ms/self.duration_ms)*w; self.playheads[i]=canv.create_line(px,0,px,35,fill="white",width=1)
-        
-        if self.duration_ms > 0:
-            for j, m in enumerate(self.markers):
-                mx=(m/self.duration_ms)*w; txt=f" {j+1}: {self.marker_labels.get(m,'')} "; y=2 if j%2==0 else 12
-                self.marker_canvas.create_text(mx+2, y, text=txt, fill=ACCENT, font=("Arial", 9, "bold"), anchor="nw"); self.marker_canvas.create_line(mx,0,mx,25,fill=ACCENT,width=1)
+        self.draw_waves(); self.draw_loop(); self.draw_markers(); self.update_ui_elements()
+
+    def draw_waves(self):
+        # Static layer: rebuilt only when the pyramid, width or view changed
+        w = self.wave_width(); s, e = self.view_range()
+        for i, canv in enumerate(self.canvases):
+            pyr = self.waveform_cache[i]; key = (pyr, w, s, e)
+            if pyr is None: canv.itemconfig(self.wave_lines[i], state="hidden"); self.wave_keys[i] = None; continue
+            if key == self.wave_keys[i]: continue
+            mn, mx, _ = pyr.columns(int(s * SR / 1000), int(e * SR / 1000), w); k = 15 / (pyr.peak or 1); xs = np.arange(len(mn))
+            canv.coords(self.wave_lines[i], np.column_stack([xs, 17 - mx * k, xs, 17 - mn * k]).ravel().tolist())
+            canv.itemconfig(self.wave_lines[i], state="normal"); self.wave_keys[i] = key
+
+    def draw_loop(self):
+        w = self.wave_width()
+        for i, canv in enumerate(self.canvases):
+            for item, ms in zip(self.loop_lines[i], (self.loop_a, self.loop_b)):
+                x = self.ms_to_x(ms, w) if ms and self.duration_ms > 0 else -10; canv.coords(item, x, 0, x, 35)
+
+    def draw_markers(self):
+        # Marker items are recreated only when markers are added, removed or renamed
+        self.marker_canvas.delete("mk"); self.marker_items = []
+        for canv in self.canvases: canv.delete("mk")
+        if self.duration_ms <= 0: return
+        for j, m in enumerate(self.markers):
+            txt = f" {j+1}: {self.marker_labels.get(m,'')} "; y = 2 if j%2==0 else 12
+            t = self.marker_canvas.create_text(0, y, text=txt, fill=ACCENT, font=("Arial", 9, "bold"), anchor="nw", tags="mk")
+            l = self.marker_canvas.create_line(0, 0, 0, 25, fill=ACCENT, width=1, tags="mk")
+            self.marker_items.append((t, l, [canv.create_line(0, 0, 0, 35, fill="#333", width=1, tags="mk") for canv in self.canvases]))
+            self.move_marker(j)
+        for i, canv in enumerate(self.canvases): canv.tag_raise(self.loop_lines[i][0]); canv.tag_raise(self.loop_lines[i][1]); canv.tag_raise(self.playheads[i])
+        self.marker_canvas.tag_raise(self.marker_ph)
+
+    def move_marker(self, j):
+        if j >= len(self.marker_items) or self.duration_ms <= 0: return
+        t, l, lines = self.marker_items[j]; mx = self.ms_to_x(self.markers[j], self.wave_width())
+        self.marker_canvas.coords(t, mx + 2, 2 if j%2==0 else 12); self.marker_canvas.coords(l, mx, 0, mx, 25)
+        for canv, item in zip(self.canvases, lines): canv.coords(item, mx, 0, mx, 35)
 
     def refresh_marker_ui(self):
         for w in self.mark_container.winfo_children(): w.destroy()
@@ -475,16 +692,16 @@ class UltimatePlayer:
     def on_lyrics_click(self, event):
         idx_str = self.ly_txt.index(f"@{event.x},{event.y}"); line_idx = int(idx_str.split(".")[0]) - 1
         if self.is_lyrics_editing:
-            line_text = self.ly_txt.get(f"{line_idx+1}.0", f"{line_idx+1}.end"); match = re.search(r'\[(\d+):(\d+\.\d+)\]', line_text)
-            if match:
-                target = (int(match.group(1))*60 + float(match.group(2)))*1000; self.play_pos_ms = target
+            line_text = self.ly_txt.get(f"{line_idx+1}.0", f"{line_idx+1}.end"); target = stamp_ms(line_text)
+            if target is not None:
+                self.play_pos_ms = target
                 if self.is_playing: self.play_from(target, ignore_count_in=True)
-                else: self.update_ui_elements(); self.draw_all_waves(); self.update_lyrics_display()
+                else: self.update_ui_elements(); self.update_lyrics_display()
             return
-        if 0 <= line_idx < len(self.lyrics_data):
-            target = float(self.lyrics_data[line_idx]['ms']); self.play_pos_ms = target
+        if 0 <= line_idx < len(self.lyrics):
+            target = max(0.0, self.lyrics.ms(line_idx)); self.play_pos_ms = target
             if self.is_playing: self.play_from(target, ignore_count_in=True)
-            else: self.update_ui_elements(); self.draw_all_waves(); self.update_lyrics_display()
+            else: self.update_ui_elements(); self.update_lyrics_display()
 
     def toggle_lyrics_edit(self):
         if not self.current_track_name: return
@@ -510,13 +727,11 @@ class UltimatePlayer:
 
     def load_metadata(self, name):
         p = self.db_path / name / "metadata.json"; self.markers = []; self.marker_labels = {}; self.loop_a = None; self.loop_b = None
-        if p.exists():
-            with open(p, "r", encoding="utf-8") as f:
-                data = json.load(f); [self.track_names[i].set(v) for i,v in enumerate(data.get("track_names", [])) if i<5]
-                [self.vols[i].set(v) for i,v in enumerate(data.get("volumes", [])) if i<5]; [self.mutes[i].set(v) for i,v in enumerate(data.get("mutes", [])) if i<5]
-                for m in data.get("markers", []): self.markers.append(m["ms"]); self.marker_labels[m["ms"]] = m["label"]
-                self.loop_a = data.get("loop_a"); self.loop_b = data.get("loop_b")
-        self.update_all_mixes()
+        data = self.meta.read(p); [self.track_names[i].set(v) for i,v in enumerate(data.get("track_names", [])) if i<5]
+        [self.vols[i].set(v) for i,v in enumerate(data.get("volumes", [])) if i<5]; [self.mutes[i].set(v) for i,v in enumerate(data.get("mutes", [])) if i<5]
+        for m in data.get("markers", []): self.markers.append(m["ms"]); self.marker_labels[m["ms"]] = m["label"]
+        self.loop_a = data.get("loop_a"); self.loop_b = data.get("loop_b")
+        self.update_all_mixes(); self.sync_loop()
 
     def save_metadata(self):
         if not self.current_track_name: return
@@ -530,22 +745,30 @@ class UltimatePlayer:
         d = {"track_names": [n.get() for n in self.track_names], "volumes": [v.get() for v in self.vols], "mutes": [m.get() for m in self.mutes], 
              "markers": [{"ms": ms, "label": self.marker_labels.get(ms, "")} for ms in self.markers], "loop_a": self.loop_a, "loop_b": self.loop_b,
              "track_mappings": mappings}
-        with open(self.db_path/self.current_track_name/"metadata.json", "w", encoding="utf-8") as f: json.dump(d, f, indent=4)
+        self.meta.write(self.db_path/self.current_track_name/"metadata.json", d)
 
-    def load_lyrics_data(self, path):
-        self.lyrics_data = []; [self.lyrics_data.append({'ms': (int(m.group(1))*60 + float(m.group(2)))*1000, 'text': m.group(3).strip()}) for line in path.read_text(encoding='utf-8').splitlines() if (m := re.search(r'\[(\d+):(\d+\.\d+)\](.*)', line))] if path.exists() else None
-        self.ly_txt.config(state=tk.NORMAL); self.ly_txt.delete('1.0', tk.END); [self.ly_txt.insert(tk.END, l['text'] + "\n") for l in self.lyrics_data]
+    def load_lyrics_data(self, path, lyrics=None):
+        self.lyrics = lyrics or Lyrics.load(path); self.current_lrc_idx = None; self.current_word = None
+        if self.song: self.song.lrc = path; self.song.lyrics = self.lyrics
+        self.ly_txt.config(state=tk.NORMAL); self.ly_txt.delete('1.0', tk.END); self.ly_txt.insert('1.0', "".join(self.lyrics.text(i) + "\n" for i in range(len(self.lyrics))))
         if not self.is_lyrics_editing: self.ly_txt.config(state=tk.DISABLED)
+        self.update_lyrics_display()
 
     def update_lyrics_display(self):
-        idx = -1; [idx := i for i, en in enumerate(self.lyrics_data) if self.play_pos_ms >= en['ms']]
+        # Bisect per tick; widgets are only touched when the line or the sung word changes
+        ly = self.lyrics; idx = ly.line_at(self.play_pos_ms)
         if idx != self.current_lrc_idx:
             self.current_lrc_idx = idx
-            t = [self.lyrics_data[idx-1]['text'] if idx > 0 else "", self.lyrics_data[idx]['text'] if idx >= 0 else "READY", self.lyrics_data[idx+1]['text'] if idx < len(self.lyrics_data)-1 else ""]
+            t = [ly.text(idx-1) if idx > 0 else "", ly.text(idx) if idx >= 0 else "READY", ly.text(idx+1) if idx < len(ly)-1 else ""]
             self.ly_prev.config(text=t[0]); self.ly_curr.config(text=t[1]); self.ly_next.config(text=t[2]); self.ly_txt.tag_remove("highlight", "1.0", tk.END)
             if idx >= 0: self.ly_txt.tag_add("highlight", f"{idx+1}.0", f"{idx+1}.end"); [self.ly_txt.see(f"{idx+1}.0") if not self.is_lyrics_editing else None]
+        word = (idx, ly.word_at(idx, self.play_pos_ms))
+        if word != self.current_word:
+            # Enhanced LRC: karaoke highlight of the word being sung in the full lyrics view
+            self.current_word = word; self.ly_txt.tag_remove("word", "1.0", tk.END)
+            if word[1] >= 0 and not self.is_lyrics_editing: a, e = ly.word_span(*word); self.ly_txt.tag_add("word", f"{idx+1}.{a}", f"{idx+1}.{e}")
 
-    def update_mix(self, i): pygame.mixer.Channel(i).set_volume(float(0 if self.mutes[i].get() else self.vols[i].get() * self.master_vol.get()))
+    def update_mix(self, i): self.mixer.set_volume(i, self.vols[i].get()); self.mixer.set_mute(i, self.mutes[i].get()); self.mixer.master = self.master_vol.get(); self.wake()
     def update_all_mixes(self): [self.update_mix(i) for i in range(5)]
     def solo_track(self, idx):
         if self.current_solo_idx == idx: [self.mutes[i].set(self.pre_solo_mutes[i]) for i in range(5)]; self.current_solo_idx = None
@@ -554,23 +777,33 @@ class UltimatePlayer:
     def toggle_mute(self, idx): self.mutes[idx].set(not self.mutes[idx].get()); self.update_mix(idx); self.save_metadata()
     def jump_to_marker(self, idx):
         if 0 <= idx < len(self.markers): t=float(self.markers[idx]); self.play_pos_ms=t; self.play_from(t, ignore_count_in=True) if self.is_playing else self.update_ui_elements()
-    def delete_marker(self, ms): self.markers.remove(ms); del self.marker_labels[ms]; self.save_metadata(); self.refresh_marker_ui(); self.draw_all_waves()
-    def save_marker_text(self, ms, ent): self.marker_labels[ms] = ent.get(); self.save_metadata(); self.draw_all_waves(); self.root.focus_force()
-    def refresh_list(self): self.listbox.delete(0, tk.END); [self.listbox.insert(tk.END, d.name) for d in sorted([x for x in self.db_path.iterdir() if x.is_dir()])] if self.db_path.exists() else None
-    def load_cover(self, p):
-        try:
-            for tag in ID3(p).values():
-                if isinstance(tag, APIC): 
-                    img = Image.open(BytesIO(tag.data)).resize((110, 110)); ph = ImageTk.PhotoImage(img)
-                    self.cover_canvas.create_image(55, 55, image=ph); self.cover_canvas.image = ph; return
-        except: pass
+    def delete_marker(self, ms): self.markers.remove(ms); del self.marker_labels[ms]; self.save_metadata(); self.refresh_marker_ui(); self.draw_markers()
+    def save_marker_text(self, ms, ent): self.marker_labels[ms] = ent.get(); self.save_metadata(); self.draw_markers(); self.root.focus_force()
+    def refresh_list(self):
+        # Refilled after every scan batch and search keystroke: the selected song and the top visible row are kept by name
+        lb = self.listbox; sel = lb.curselection(); picked = lb.get(sel[0]) if sel else None
+        top = lb.get(lb.nearest(0)) if lb.size() else None
+        names = self.library.search(self.search_var.get()); lb.delete(0, tk.END)
+        if names: lb.insert(tk.END, *names)
+        rows = {n: i for i, n in enumerate(names)}
+        if picked in rows: lb.selection_set(rows[picked]); lb.activate(rows[picked])
+        if top in rows: lb.yview(rows[top])
+    def cover_image(self, p):
+        # Decoded off the GUI thread and kept with the song; only the PhotoImage is made on show
+        return load_cover(self.assets, p)
+    def show_cover(self, img):
         self.cover_canvas.delete("all")
+        if img is not None: ph = ImageTk.PhotoImage(img); self.cover_canvas.create_image(55, 55, image=ph); self.cover_canvas.image = ph
     def on_resize_event(self, event): 
         if event.widget == self.root: self.root.after(150, self.draw_all_waves)
     def add_marker(self):
         if self.duration_ms > 0:
-            ms = round(self.play_pos_ms, 0)
-            if ms not in self.markers: self.markers.append(ms); self.markers.sort(); self.marker_labels[ms] = f"Part {len(self.markers)}"; self.save_metadata(); self.refresh_marker_ui(); self.draw_all_waves()
+            ms = round(self.snap(self.play_pos_ms), 0)
+            if ms not in self.markers: self.markers.append(ms); self.markers.sort(); self.marker_labels[ms] = f"Part {len(self.markers)}"; self.save_metadata(); self.refresh_marker_ui(); self.draw_markers()
 
 if __name__ == "__main__":
-    root = tk.Tk(); app = UltimatePlayer(root); root.mainloop()
\ No newline at end of file
+    multiprocessing.freeze_support()
+    if "--warm" in sys.argv:
+        # Headless: build the whole library's cache and exit (the EXE has no separate warm.py)
+        import warm; warm.main([a for a in sys.argv[1:] if a != "--warm"])
+    else: root = tk.Tk(); app = UltimatePlayer(root); root.mainloop()
\ No newline at end of file
@@ -1,63 +1,179 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
 import os
 import shutil
-import subprocess
-import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+import numpy as np
+from assets import AssetCache
+from atomic import atomic_write
+from pcm import PcmTrack, write_wav
+from spectrum import load_spectrum
+from waveform import load_peaks
 
 # Set base directory to the script's location for portability
 BASE_DIR = Path(__file__).parent
+MODEL = "htdemucs"
+BITRATE = 256
+OVERLAP = 0.25
+STEMS = ["bass.mp3", "drums.mp3", "other.mp3", "vocals.mp3"]
 
-def process_file(mp3_path, db_dir, temp_dir):
-    mp3_path = Path(mp3_path)
+# Loaded once per worker process by _init_worker, reused for every file that worker gets
+_model = None
+
+
+def _init_worker(model_name, threads):
+    global _model
+    import torch
+    from demucs.pretrained import get_model
+    torch.set_num_threads(threads)
+    _model = get_model(model_name); _model.eval()
+
+
+def _int16(x):
+    # (channels, frames) float tensor -> (frames, channels) int16, scaled down instead of clipped if it peaks over 1
+    a = x.numpy().T; peak = float(np.abs(a).max()) if a.size else 0.0
+    return (np.clip(a / max(1.01 * peak, 1.0), -1, 1) * 32767).astype(np.int16)
+
+
+def _index(assets, src, data=None):
+    # PCM (unless src maps natively), waveform peaks and spectrum into the player's cache: the song opens without decoding
+    if data is not None: assets.write(assets.path_for(src, "pcm"), data)
+    tr = PcmTrack(assets.load_pcm(src), src); load_peaks(assets, tr); load_spectrum(assets, tr)
+
+
+def separate(mp3_path, db_dir, temp_dir, mp3=False):
+    # Runs in a worker: Demucs in-process on CPU, no subprocess, no re-import of torch or the weights.
+    # Stems are written to the job's own temp dir and only moved into the database once all of them exist.
+    # Native output is 16-bit 44.1 kHz WAV, which the player memory-maps as is; MP3 copies only with mp3=True.
+    import torch
+    from demucs.apply import apply_model
+    from demucs.audio import AudioFile, save_audio
+    mp3_path = Path(mp3_path); temp_dir = Path(temp_dir)
     name = mp3_path.stem
     final_folder = db_dir / name
     stems_folder = final_folder / "stems"
+    shutil.rmtree(temp_dir, ignore_errors=True); temp_dir.mkdir(parents=True)
+
+    t0 = time.perf_counter()
+    wav = AudioFile(mp3_path).read(streams=0, samplerate=_model.samplerate, channels=_model.audio_channels)
+    ref = wav.mean(0); mean, std = ref.mean(), ref.std()
+    with torch.no_grad():
+        sources = apply_model(_model, ((wav - mean) / std)[None], device="cpu", split=True, overlap=OVERLAP, progress=False)[0]
+    sources = sources * std + mean
+    for source, stem in zip(sources, _model.sources):
+        write_wav(temp_dir / f"{stem}.wav", _int16(source))
+        if mp3: save_audio(source, str(temp_dir / f"{stem}.mp3"), samplerate=_model.samplerate, bitrate=BITRATE)
+
     stems_folder.mkdir(parents=True, exist_ok=True)
+    for f in temp_dir.iterdir(): os.replace(f, stems_folder / f.name)
+    target_original = final_folder / mp3_path.name
+    if mp3_path.resolve() != target_original.resolve():
+        shutil.copy(str(mp3_path), str(target_original))
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+    assets = AssetCache(BASE_DIR / "cache")
+    _index(assets, target_original, _int16(wav))
+    for stem in _model.sources: _index(assets, stems_folder / f"{stem}.wav")
+    return name, time.perf_counter() - t0, wav.shape[-1] / _model.samplerate
+
+
+class Manifest:
+    # jobs.json: content hash per input (re-hashed only when size/mtime change) and every finished job.
+    # A job is keyed by input hash + model + settings, so renamed files are not redone and new settings are.
+    def __init__(self, path):
+        self.path = Path(path); self.data = {"inputs": {}, "jobs": {}}
+        if self.path.exists():
+            try: self.data.update(json.loads(self.path.read_text(encoding="utf-8")))
+            except (OSError, ValueError): print(f"❌ Manifest unreadable, starting a new one: {self.path}")
+
+    def content_hash(self, f):
+        st = f.stat(); k = str(f.resolve()); e = self.data["inputs"].get(k)
+        if e and e["size"] == st.st_size and e["mtime_ns"] == st.st_mtime_ns: return e["hash"]
+        h = hashlib.sha1()
+        with open(f, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b""): h.update(chunk)
+        self.data["inputs"][k] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": h.hexdigest()}
+        return h.hexdigest()
+
+    def job_id(self, f, model, mp3=False):
+        settings = {"model": model, "bitrate": BITRATE, "overlap": OVERLAP, "format": "wav+mp3" if mp3 else "wav"}
+        return hashlib.sha1((self.content_hash(f) + json.dumps(settings, sort_keys=True)).encode()).hexdigest()[:16], settings
+
+    def done(self, jid, db_dir):
+        job = self.data["jobs"].get(jid)
+        return job is not None and all((db_dir / job["name"] / "stems" / s).exists() for s in job["stems"])
+
+    def finish(self, jid, name, settings, stems, save=True):
+        self.data["jobs"][jid] = {"name": name, **settings, "stems": stems, "finished": time.strftime("%Y-%m-%d %H:%M:%S")}
+        if save: self.save()
+
+    def save(self):
+        atomic_write(self.path, lambda f: json.dump(self.data, f, indent=4), "w")
+
+
+def process_files(files, db_dir, workers=None, threads=None, model=MODEL, force=False, mp3=False):
+    # Files are spread over worker processes; each worker loads the model once and gets a fixed thread budget.
+    # Jobs already in the manifest with their stems on disk are skipped, so an interrupted run just resumes.
+    manifest = Manifest(BASE_DIR / "jobs.json"); temp_root = BASE_DIR / "demucs_temp"; jobs = {}
+    for f in files:
+        jid, settings = manifest.job_id(f, model, mp3)
+        if not force and jid not in manifest.data["jobs"] and model == MODEL and all((db_dir / f.stem / "stems" / s).exists() for s in STEMS):
+            # Separated as MP3 before the manifest existed: playable as it is, take it over as done
+            manifest.finish(jid, f.stem, settings, STEMS, save=False)
+        if force or not manifest.done(jid, db_dir): jobs[jid] = (Path(f), settings)
+    manifest.save()
+    if len(jobs) < len(files): print(f"⏭ {len(files) - len(jobs)} files already separated")
+    if not jobs: return
+    files = [f for f, _ in jobs.values()]
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(len(files), workers or max(1, cpus // 4)))
+    threads = threads or max(1, cpus // workers)
+    print(f"💎 AI Separation (Demucs {model}): {len(files)} files, {workers} workers x {threads} threads")
+
+    t0 = time.perf_counter(); done = 0; audio = 0.0
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker, initargs=(model, threads)) as pool:
+        futures = {pool.submit(separate, str(f), db_dir, str(temp_root / jid), mp3): jid for jid, (f, _) in jobs.items()}
+        for fut in as_completed(futures):
+            jid = futures[fut]; f, settings = jobs[jid]
+            try:
+                name, secs, length = fut.result(); done += 1; audio += length
+                manifest.finish(jid, name, settings, sorted(p.name for p in (db_dir / name / "stems").iterdir() if p.suffix in (".wav", ".mp3")))
+                print(f"✅ Completed: {name} ({secs:.1f} s, {length / secs:.2f}x realtime)")
+            except Exception as e:
+                print(f"❌ Error processing {f.stem}: {e}")
+
+    wall = time.perf_counter() - t0
+    try: temp_root.rmdir()
+    except OSError: pass
+    print(f"⏱ {done}/{len(files)} files, {audio / 60:.1f} min of audio in {wall:.1f} s ({audio / max(wall, 1e-9):.2f}x realtime)")
 
-    print(f"\n💎 AI Separation (Demucs): {name}")
-    
-    # Run Demucs via subprocess
-    try:
-        subprocess.run([
-            sys.executable, "-m", "demucs.separate",
-            "--mp3", "--mp3-bitrate", "256",
-            "-o", str(temp_dir),
-            "-n", "htdemucs",
-            str(mp3_path)
-        ], check=True)
-
-        results_dir = temp_dir / "htdemucs" / name
-        mapping = {"vocals.mp3": "vocals.mp3", "drums.mp3": "drums.mp3", 
-                   "bass.mp3": "bass.mp3", "other.mp3": "other.mp3"}
-
-        for old, new in mapping.items():
-            source = results_dir / old
-            if source.exists():
-                shutil.move(str(source), str(stems_folder / new))
-
-        target_original = final_folder / mp3_path.name
-        if mp3_path.resolve() != target_original.resolve():
-            shutil.copy(str(mp3_path), str(target_original))
-        
-        print(f"✅ Completed: {name}")
-    except Exception as e:
-        print(f"❌ Error processing {name}: {e}")
 
 def main():
+    ap = argparse.ArgumentParser(description="Split MP3s into stems for StemQuina")
+    ap.add_argument("files", nargs="*", help="MP3 files (default: every MP3 in mp3/)")
+    ap.add_argument("-j", "--workers", type=int, help="worker processes (default: CPU cores / 4)")
+    ap.add_argument("-t", "--threads", type=int, help="torch threads per worker (default: CPU cores / workers)")
+    ap.add_argument("-n", "--model", default=MODEL)
+    ap.add_argument("--mp3", action="store_true", help="also export the stems as MP3 for use outside StemQuina")
+    ap.add_argument("-f", "--force", action="store_true", help="separate again even if the manifest has the job")
+    args = ap.parse_args()
+
     db_dir = BASE_DIR / "database"
-    temp_dir = BASE_DIR / "demucs_temp"
     db_dir.mkdir(exist_ok=True)
 
-    if len(sys.argv) > 1:
-        process_file(sys.argv[1], db_dir, temp_dir)
-    else:
+    files = [Path(f) for f in args.files]
+    if not files:
         input_dir = BASE_DIR / "mp3"
         input_dir.mkdir(exist_ok=True)
-        for mp3_path in input_dir.glob("*.mp3"):
-            process_file(mp3_path, db_dir, temp_dir)
+        files = sorted(input_dir.glob("*.mp3"))
+    if files:
+        process_files(files, db_dir, args.workers, args.threads, args.model, args.force, args.mp3)
 
-    if temp_dir.exists():
-        shutil.rmtree(temp_dir)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,120 @@
+import functools
+import json
+import os
+import time
+from pathlib import Path
+
+MAX_BYTES = 1024 ** 2
+
+
+class LoadTimer:
+    # Phases of one song load in ms since it started, written as one log line by done()
+    def __init__(self, prof, name):
+        self.prof = prof; self.name = name; self.t0 = time.perf_counter(); self.phases = {}
+
+    def mark(self, phase): self.phases[phase] = round((time.perf_counter() - self.t0) * 1000.0, 2)
+
+    def done(self, complete=True):
+        self.mark("done"); self.prof.last_load = self.phases["done"]
+        self.prof.write({"event": "load", "song": self.name, "complete": complete, **self.phases})
+
+
+class Profiler:
+    # Frame-time profiler for the UI loop. Switched off it costs nothing: the timed methods are only wrapped on
+    # the instance while it is on, and the wrappers are removed again when it is switched off.
+    # Every `window` seconds one summary line (per-component mean/max, late and dropped ticks) goes to a JSON-lines
+    # log that rotates at max_bytes, and on_window(lines) gets the same numbers as text for an overlay.
+    def __init__(self, log_path, names, tick="update_loop", interval_ms=20, window=1.0, max_bytes=MAX_BYTES, backups=3, on_window=None):
+        self.log_path = Path(log_path); self.names = list(names); self.tick_name = tick
+        self.interval_ms = interval_ms; self.window = window; self.max_bytes = max_bytes; self.backups = backups
+        self.on_window = on_window; self.on = False; self.target = None; self.last_load = None; self.last_seek = None
+        self.reset()
+
+    def reset(self):
+        self.t_window = time.perf_counter(); self.t_tick = None; self.ticks = 0; self.late = 0; self.dropped = 0
+        self.stats = {}; self.seek = None
+
+    def enable(self, target):
+        if self.on: return
+        self.target = target; self.reset(); self.on = True
+        for n in self.names: setattr(target, n, self._timed(n, getattr(target, n)))
+
+    def disable(self):
+        if not self.on: return
+        for n in self.names: self.target.__dict__.pop(n, None)
+        self.flush(); self.on = False
+
+    def toggle(self, target):
+        if self.on: self.disable()
+        else: self.enable(target)
+        return self.on
+
+    def _timed(self, name, f):
+        @functools.wraps(f)
+        def run(*a, **kw):
+            t0 = time.perf_counter()
+            if name == self.tick_name: self._tick(t0)
+            try: return f(*a, **kw)
+            finally: self.add(name, time.perf_counter() - t0)
+        return run
+
+    def add(self, name, secs):
+        s = self.stats.get(name)
+        if s is None: self.stats[name] = [1, secs, secs]
+        else: s[0] += 1; s[1] += secs; s[2] = max(s[2], secs)
+
+    def _tick(self, t):
+        # A tick is late when it starts more than half an interval after it was due; each whole interval missed is a dropped tick
+        if self.t_tick is not None:
+            gap = (t - self.t_tick) * 1000.0
+            if gap > self.interval_ms * 1.5: self.late += 1; self.dropped += max(0, int(gap / self.interval_ms) - 1)
+        self.t_tick = t; self.ticks += 1
+        if self.seek is not None: self._check_seek()
+        if t - self.t_window >= self.window: self.flush()
+
+    def load(self, name): return LoadTimer(self, name) if self.on else None
+
+    def seek_started(self, t0, started):
+        # Seek latency: from the click (time.monotonic() t0) until started() reports when the first new block played
+        self.seek = (t0, started)
+
+    def _check_seek(self):
+        t0, started = self.seek; t = started()
+        if t is None:
+            if time.monotonic() - t0 > 5.0: self.seek = None
+            return
+        self.seek = None; self.last_seek = round((t - t0) * 1000.0, 2); self.write({"event": "seek", "ms": self.last_seek})
+
+    def summary(self):
+        secs = time.perf_counter() - self.t_window
+        return {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "seconds": round(secs, 3), "ticks": self.ticks, "late": self.late, "dropped": self.dropped,
+                "components": {n: {"n": s[0], "mean_ms": round(s[1] / s[0] * 1000.0, 3), "max_ms": round(s[2] * 1000.0, 3)} for n, s in self.stats.items()}}
+
+    def lines(self, entry):
+        out = [f"{entry['ticks']} ticks/{entry['seconds']:.1f} s  late {entry['late']}  dropped {entry['dropped']}"]
+        for n, c in sorted(entry["components"].items(), key=lambda kv: -kv[1]["mean_ms"]):
+            out.append(f"{n[:22]:<22} {c['mean_ms']:6.2f} {c['max_ms']:7.2f} ms")
+        if self.last_seek is not None: out.append(f"seek {self.last_seek:.0f} ms")
+        if self.last_load is not None: out.append(f"load {self.last_load:.0f} ms")
+        return out
+
+    def flush(self):
+        if self.ticks:
+            entry = self.summary(); self.write(entry)
+            if self.on_window: self.on_window(self.lines(entry))
+        seek = self.seek; self.reset(); self.seek = seek
+
+    def write(self, entry):
+        try:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            if self.log_path.exists() and self.log_path.stat().st_size > self.max_bytes: self._rotate()
+            with open(self.log_path, "a", encoding="utf-8") as f: f.write(json.dumps(entry) + "\n")
+        except OSError: pass
+
+    def _rotate(self):
+        # profile.jsonl -> .1 -> .2 ...; the oldest backup is overwritten
+        p = self.log_path
+        for k in range(self.backups - 1, 0, -1):
+            src = p.with_name(f"{p.name}.{k}")
+            if src.exists(): os.replace(src, p.with_name(f"{p.name}.{k + 1}"))
+        os.replace(p, p.with_name(f"{p.name}.1"))
@@ -0,0 +1,45 @@
+import threading
+from collections import OrderedDict
+
+MAX_BYTES = 1024 ** 3
+
+
+class LoadedSong:
+    # Everything a song switch needs (tracks, peaks, spectra, beat grid, lyrics, cover), so a cached song is shown without
+    # decoding. While a song is current the player works on these same lists, so the cache never goes stale.
+    def __init__(self, name, layout, paths, mappings, stems, lrc, orig):
+        self.name = name; self.layout = layout; self.paths = paths; self.mappings = mappings; self.stems = stems
+        self.lrc = lrc; self.orig = orig; self.lyrics = None; self.cover = None; self.complete = False
+        self.tracks = [None] * 5; self.peaks = [None] * 5; self.spectra = [None] * 5
+        self.beats = None
+
+    @property
+    def nbytes(self):
+        return (sum(t.data.nbytes for t in self.tracks if t is not None) + sum(p.nbytes for p in self.peaks if p is not None)
+                + sum(s[1].nbytes for s in self.spectra if s is not None) + (self.beats.nbytes if self.beats is not None else 0))
+
+
+class SongCache:
+    # LRU of fully loaded songs bounded by bytes; the song on screen is never evicted
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes; self.items = OrderedDict(); self.lock = threading.Lock()
+
+    def get(self, name):
+        with self.lock:
+            song = self.items.get(name)
+            if song is not None: self.items.move_to_end(name)
+            return song
+
+    def put(self, song, keep=None):
+        with self.lock:
+            self.items[song.name] = song; self.items.move_to_end(song.name)
+            total = sum(s.nbytes for s in self.items.values())
+            for name in [n for n in self.items if n not in (song.name, keep)]:
+                if total <= self.max_bytes: break
+                total -= self.items.pop(name).nbytes
+
+    def drop(self, name):
+        with self.lock: self.items.pop(name, None)
+
+    @property
+    def nbytes(self): return sum(s.nbytes for s in self.items.values())
@@ -0,0 +1,48 @@
+import numpy as np
+
+# Spectrum index: one STFT pass per track at load, 20 log-magnitude bands per hop and channel.
+# The analyzer then reads one row per UI tick instead of running an FFT on the GUI thread.
+N_FFT = 2048
+HOP = 1024
+BANDS = 20
+CHUNK = 256  # hops per FFT batch, bounds the temporary (CHUNK, N_FFT, channels) float32 array
+
+
+class SpectrumIndex:
+    def __init__(self, bands, frames):
+        self.bands = bands; self.frames = frames
+
+    @classmethod
+    def build(cls, data):
+        n = max(0, (len(data) - N_FFT) // HOP + 1); ch = data.shape[1]
+        bands = np.zeros((n, ch, BANDS), np.float16)
+        # Same analysis the live analyzer did: first N_FFT / 2 bins, split into 20 equal groups, mean of log10(|X| + 1)
+        split = np.array_split(np.arange(N_FFT // 2), BANDS)
+        edges = np.array([b[0] for b in split]); sizes = np.array([len(b) for b in split], np.float32)
+        for h0 in range(0, n, CHUNK):
+            h1 = min(n, h0 + CHUNK); idx = np.arange(h0, h1)[:, None] * HOP + np.arange(N_FFT)
+            mag = np.abs(np.fft.rfft(data[idx].astype(np.float32), axis=1))[:, :N_FFT // 2]
+            bands[h0:h1] = (np.add.reduceat(np.log10(mag + 1), edges, axis=1) / sizes[None, :, None]).transpose(0, 2, 1)
+        return cls(bands, len(data))
+
+    def save(self, f):
+        np.savez(f, frames=np.int64(self.frames), bands=self.bands)
+
+    @classmethod
+    def load(cls, f):
+        with np.load(f) as z: return cls(z["bands"], int(z["frames"]))
+
+    @property
+    def nbytes(self): return self.bands.nbytes
+
+    def at(self, frame):
+        # (channels, BANDS) of the window starting at or just before frame, None outside the song
+        h = int(frame) // HOP
+        return self.bands[h] if 0 <= h < len(self.bands) else None
+
+
+def load_spectrum(assets, track):
+    # Cached next to the PCM like the peak pyramid; a track still streaming has no index yet
+    if track is None or not getattr(track, "complete", True): return None
+    if track.path is None: return SpectrumIndex.build(track.data[:track.frames])
+    return assets.cached(track.path, "spec", SpectrumIndex.load, lambda: SpectrumIndex.build(track.data[:track.frames]), SpectrumIndex.save)
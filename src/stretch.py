@@ -0,0 +1,181 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from pcm import SR, CHANNELS
+
+# WSOLA: 1024-frame Hann windows at 50 % overlap, +-256 frame similarity search on a 4x decimated mono mix.
+# The search chain restarts every ANCHOR frames (from the natural continuation of the frame before), so where a frame
+# lands only depends on its index: any range renders sample-identical to the same frames of a one-shot render.
+FRAME = 1024
+HOP = FRAME // 2
+TOL = 256
+DECIM = 4
+ANCHOR = 64
+SEGMENT = SR * 2
+HEAD = SR // 4
+WINDOW = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(FRAME) / FRAME)).astype(np.float32)
+
+
+def wsola(x, speed, o0, o1):
+    # Renders output frames [o0, o1) of x stretched by speed (output frame o ~ input frame o * speed)
+    if o1 <= o0: return np.zeros((0, CHANNELS), dtype=np.int16)
+    k0 = max(0, (o0 - FRAME) // HOP + 1); k1 = max(k0, (o1 - 1) // HOP + 1)
+    # Frame positions are searched from the anchor at or before k0 (kept, but only frames k0..k1 are gathered)
+    ka = k0 // ANCHOR * ANCHOR
+    nat = np.round(np.arange(ka - 1, k1) * HOP * speed).astype(np.int64)
+    lo_in = max(0, int(nat[0]) - TOL); hi_in = min(len(x), int(nat[-1]) + TOL + FRAME + HOP)
+    mono = x[lo_in:hi_in].mean(axis=1, dtype=np.float32)
+    pos = nat.copy(); tl = FRAME // DECIM
+    for j in range(1, len(nat)):
+        k = ka - 1 + j
+        if k == 0: continue
+        prev = nat[j-1] if k % ANCHOR == 0 else pos[j-1]
+        cont = int(prev) + HOP - lo_in; tmpl = mono[cont:cont + FRAME:DECIM]
+        lo = max(0, int(nat[j]) - TOL - lo_in); region = mono[lo:int(nat[j]) + TOL + FRAME - lo_in:DECIM]
+        if len(tmpl) < tl or len(region) < tl: continue
+        scores = sliding_window_view(region, tl) @ tmpl
+        pos[j] = lo_in + lo + int(np.argmax(scores)) * DECIM
+    pos = np.clip(pos[k0 - ka + 1:], 0, max(0, len(x) - 1))
+    # Gather every frame at once, window, then overlap-add the two halves (HOP == FRAME / 2)
+    idx = np.minimum(pos[:, None] + np.arange(FRAME), len(x) - 1)
+    frames = x[idx].astype(np.float32) * WINDOW[None, :, None]
+    frames[(pos[:, None] + np.arange(FRAME)) >= len(x)] = 0
+    out = np.zeros(((k1 - k0 + 1) * HOP, CHANNELS), dtype=np.float32)
+    out[:(k1 - k0) * HOP] += frames[:, :HOP].reshape(-1, CHANNELS)
+    out[HOP:] += frames[:, HOP:].reshape(-1, CHANNELS)
+    base = k0 * HOP
+    return np.clip(out[o0 - base:o1 - base], -32768, 32767).astype(np.int16)
+
+
+class StretchedTrack:
+    # Pitch-preserving copy of a PcmTrack at one speed, rendered segment by segment on demand
+    def __init__(self, source, speed):
+        self.source = source; self.speed = speed; self.path = source.path
+        self.out_frames = int(source.frames / speed)
+        self.data = np.zeros((self.out_frames, CHANNELS), dtype=np.int16)
+        self.seg_out = max(1, int(SEGMENT / speed))
+        self.ready = np.zeros((self.out_frames + self.seg_out - 1) // self.seg_out, dtype=bool)
+        self.head = (0, 0); self.lock = threading.Lock()
+
+    @property
+    def frames(self): return self.source.frames
+
+    @property
+    def nbytes(self): return self.data.nbytes
+
+    def render_segment(self, j):
+        if self.ready[j]: return
+        with self.lock:
+            if self.ready[j]: return
+            o0 = j * self.seg_out; o1 = min(self.out_frames, o0 + self.seg_out)
+            if not self.source.ready(max(0, int(o0 * self.speed) - TOL), int((o1 - o0) * self.speed) + FRAME + 2 * TOL): return
+            self.data[o0:o1] = wsola(self.source.data, self.speed, o0, o1); self.ready[j] = True
+
+    def render_head(self, o0, n=HEAD):
+        # A short slice from o0 so playback can start before its whole segment is there; the segment renders the
+        # same samples over it later, so reading the slice meanwhile is safe
+        o1 = min(self.out_frames, o0 + n)
+        if o1 <= o0 or self.ready[o0 // self.seg_out]: return
+        with self.lock:
+            if not self.source.ready(max(0, int(o0 * self.speed) - TOL), int((o1 - o0) * self.speed) + FRAME + 2 * TOL): return
+            self.data[o0:o1] = wsola(self.source.data, self.speed, o0, o1); self.head = (o0, o1)
+
+    def ensure(self, o0, o1):
+        for j in range(o0 // self.seg_out, min(len(self.ready), (max(o0, o1 - 1)) // self.seg_out + 1)): self.render_segment(j)
+
+    def render(self, pos, n, speed=None):
+        # Same contract as PcmTrack.render: pos and the returned position are in source frames
+        o = int(pos / self.speed); end = min(self.out_frames, o + n)
+        if not self.head[0] <= o <= end <= self.head[1]: self.ensure(o, end)
+        return self.data[o:end], pos + (end - o) * self.speed
+
+
+class StretchCache:
+    # LRU of (file, frames, speed) -> StretchedTrack, bounded by bytes; the current speed is never evicted
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes; self.items = OrderedDict(); self.lock = threading.Lock()
+
+    def key(self, track, speed): return (str(track.path) if track.path else id(track), track.frames, round(speed, 2))
+
+    def get(self, track, speed):
+        k = self.key(track, speed)
+        with self.lock:
+            st = self.items.get(k)
+            if st is not None and st.source is track: self.items.move_to_end(k); return st
+            st = StretchedTrack(track, round(speed, 2)); self.items[k] = st
+            total = sum(v.nbytes for v in self.items.values())
+            for old in [kk for kk in self.items if kk[2] != k[2]]:
+                if total <= self.max_bytes: break
+                total -= self.items.pop(old).nbytes
+            return st
+
+    @property
+    def nbytes(self): return sum(v.nbytes for v in self.items.values())
+
+    def clear(self):
+        with self.lock: self.items.clear()
+
+
+class StretchStream:
+    # StretchedTrack for one pass through the song (offline export): the same segments, but only the last few are
+    # held, so memory does not grow with the song. Output is identical to what playback renders at that speed.
+    def __init__(self, source, speed, keep=3):
+        self.source = source; self.speed = round(speed, 2); self.path = source.path; self.keep = keep
+        self.out_frames = int(source.frames / self.speed); self.seg_out = max(1, int(SEGMENT / self.speed)); self.segs = OrderedDict()
+
+    @property
+    def frames(self): return self.source.frames
+
+    def segment(self, j):
+        seg = self.segs.get(j)
+        if seg is None:
+            o0 = j * self.seg_out; seg = self.segs[j] = wsola(self.source.data, self.speed, o0, min(self.out_frames, o0 + self.seg_out))
+            if len(self.segs) > self.keep: self.segs.popitem(last=False)
+        return seg
+
+    def render(self, pos, n, speed=None):
+        o = int(pos / self.speed); end = min(self.out_frames, o + n); parts = []; k = o
+        while k < end:
+            j, off = divmod(k, self.seg_out); seg = self.segment(j)[off:off + end - k]; parts.append(seg); k += len(seg)
+        out = parts[0] if len(parts) == 1 else np.concatenate(parts) if parts else np.zeros((0, CHANNELS), np.int16)
+        return out, pos + (end - o) * self.speed
+
+
+class StretchStreams:
+    # Drop-in for StretchCache on an offline mixer: one StretchStream per track and speed
+    def __init__(self): self.items = {}
+
+    def get(self, track, speed):
+        k = (id(track), round(speed, 2)); st = self.items.get(k)
+        if st is None: st = self.items[k] = StretchStream(track, speed)
+        return st
+
+
+class StretchRenderer:
+    # Background worker: renders the segment under the playhead first, then outward from it. prepare() itself only
+    # renders a HEAD slice at the playhead per track, so a speed change starts playing without waiting for segments
+    def __init__(self, cache):
+        self.cache = cache; self.jobs = []; self.cv = threading.Condition()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def prepare(self, tracks, speed, frame):
+        if round(speed, 2) == 1.0:
+            with self.cv: self.jobs = []
+            return
+        jobs = []
+        for tr in tracks:
+            if tr is None: continue
+            st = self.cache.get(tr, speed); here = min(len(st.ready) - 1, int(frame / speed) // st.seg_out)
+            if here < 0: continue
+            st.render_head(int(frame / speed))
+            jobs += [(abs(j - here) + (0.5 if j < here else 0), j, st) for j in range(len(st.ready)) if not st.ready[j]]
+        jobs.sort(key=lambda t: t[0], reverse=True)
+        with self.cv: self.jobs = jobs; self.cv.notify()
+
+    def _run(self):
+        while True:
+            with self.cv:
+                while not self.jobs: self.cv.wait()
+                _, j, st = self.jobs.pop()
+            st.render_segment(j)
@@ -0,0 +1,112 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from assets import AssetCache
+from beats import load_beats
+from cover import load_cover
+from export import song_mix
+from library import stem_files
+from lyrics import load_lyrics
+from pcm import SR, CHANNELS, PcmTrack, estimate_frames
+import spectrum
+import waveform
+from spectrum import load_spectrum
+from waveform import load_peaks
+
+# Pre-warm of the whole library: decoded PCM, waveform peaks and spectrum index per audio file, the beat grid of
+# the drums stem (or the original), parsed lyrics and the cover thumbnail per song. What is already in the cache for the file as it is now is skipped, so a re-run
+# only does what changed since the last one.
+KINDS = ("pcm", "peaks", "spec")
+# Cache bytes per source frame of each kind (the beat grid is a few KB per song)
+BYTES_PER_FRAME = {"pcm": 2 * CHANNELS, "peaks": sum(CHANNELS * 3 * 2 / b for b in waveform.LEVELS),
+                   "spec": CHANNELS * spectrum.BANDS * 2 / spectrum.HOP, "beats": 0}
+
+
+def _warm_file(cache_root, src, kinds):
+    # Runs in a worker: one file's PCM (decoded into the cache unless it maps natively), then peaks and spectrum from it
+    assets = AssetCache(cache_root); t0 = time.perf_counter()
+    tr = PcmTrack(assets.load_pcm(src), src)
+    if "peaks" in kinds: load_peaks(assets, tr)
+    if "spec" in kinds: load_spectrum(assets, tr)
+    if "beats" in kinds: load_beats(assets, tr)
+    return tr.frames, time.perf_counter() - t0
+
+
+def _warm_song(cache_root, lrc, mp3):
+    assets = AssetCache(cache_root)
+    if lrc is not None: load_lyrics(assets, lrc)
+    if mp3 is not None: load_cover(assets, mp3)
+    return 0, 0.0
+
+
+def missing(assets, src, kinds=KINDS):
+    # Which of kinds the cache lacks for src (path_for keys by size + mtime, so a changed file counts as missing)
+    return [k for k in kinds if not (assets.has_pcm(src) if k == "pcm" else assets.path_for(src, k).exists())]
+
+
+def size(assets, src, kinds):
+    # Cache bytes of src's entries of kinds, from its length; a native WAV stem is mapped in place, its PCM is not copied
+    data = assets.native(src); frames = len(data) if data is not None else estimate_frames(src)
+    return int(frames * sum(BYTES_PER_FRAME[k] for k in kinds if k != "pcm" or data is None))
+
+
+def plan(assets, db_path):
+    # (song, kind of job, args) for everything not up to date, the number of items that are, and the cache bytes the
+    # whole library needs when warm
+    jobs = []; fresh = 0; need = 0
+    for song in sorted(d for d in Path(db_path).iterdir() if d.is_dir()):
+        # The files the player reads: the original and the stems with a WAV winning over its MP3 copy; the beat grid for
+        # the slot Engine.beat_source picks from the player's mapping (a drums stem, else the original)
+        mp3s = sorted(song.glob("*.mp3")); stems = [song / "stems" / f for f in stem_files(song / "stems")]
+        slots = song_mix(db_path, song.name)[0]
+        beat_src = next((p for p in slots if p is not None and "drum" in p.name.lower()), slots[0])
+        for src in mp3s[:1] + stems:
+            kinds = KINDS + ("beats",) if src == beat_src else KINDS
+            todo = missing(assets, src, kinds); fresh += len(kinds) - len(todo); need += size(assets, src, kinds)
+            if todo: jobs.append((song.name, f"{src.relative_to(song)} ({', '.join(todo)})", _warm_file, (str(src), todo)))
+        lrc = next(iter(sorted(song.glob("*.lrc"))), None); mp3 = mp3s[0] if mp3s else None
+        lrc_todo = lrc is not None and not assets.path_for(lrc, "lrc").exists()
+        cover_todo = mp3 is not None and not assets.path_for(mp3, "cover").exists()
+        fresh += (lrc is not None and not lrc_todo) + (mp3 is not None and not cover_todo)
+        if lrc_todo or cover_todo: jobs.append((song.name, "lyrics/cover", _warm_song, (str(lrc) if lrc_todo else None, str(mp3) if cover_todo else None)))
+    return jobs, fresh, need
+
+
+def warm(db_path, cache_root, workers=None, log=print):
+    assets = AssetCache(cache_root); t0 = time.perf_counter()
+    jobs, fresh, need = plan(assets, db_path)
+    if need > assets.max_bytes:
+        # Warming more than the cache holds would evict its own earlier output, and a re-run would never be up to date
+        log(f"❌ The warm library needs ~{need / 1024 ** 2:.0f} MB of cache, the limit is {assets.max_bytes / 1024 ** 2:.0f} MB "
+            f"(MAX_BYTES in assets.py): nothing warmed"); return
+    if not jobs: log(f"✅ Cache warm: all {fresh} items up to date"); return
+    workers = max(1, min(len(jobs), workers or os.cpu_count() or 1))
+    log(f"🔥 Warming {len(jobs)} jobs on {workers} processes ({fresh} items already up to date)")
+    done = failed = 0; frames = 0; work = 0.0
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {pool.submit(fn, str(assets.root), *args): (song, what) for song, what, fn, args in jobs}
+        for fut in as_completed(futures):
+            song, what = futures[fut]
+            try: n, secs = fut.result(); done += 1; frames += n; work += secs; log(f"[{done + failed}/{len(jobs)}] {song}/{what} {secs:.1f} s")
+            except Exception as e: failed += 1; log(f"❌ [{done + failed}/{len(jobs)}] {song}/{what}: {e}")
+    wall = time.perf_counter() - t0; audio = frames / SR
+    log(f"✅ Cache warm: {done} jobs in {wall:.1f} s ({done / max(wall, 1e-9):.1f} jobs/s, {audio / 60:.1f} min of audio, "
+        f"{audio / max(wall, 1e-9):.0f}x realtime, {work / max(wall, 1e-9):.1f} cores busy), {failed} failed, {assets.nbytes / 1024 ** 2:.0f} MB on disk")
+
+
+def main(argv=None):
+    base = Path(sys.executable).parent if getattr(sys, 'frozen', False) else Path(__file__).parent
+    ap = argparse.ArgumentParser(description="Pre-build StemQuina's cache (PCM, waveforms, spectra, beat grids, lyrics, covers) for the whole library")
+    ap.add_argument("database", nargs="?", type=Path, default=base / "database")
+    ap.add_argument("-j", "--workers", type=int, help="processes (default: all CPU cores)")
+    args = ap.parse_args(argv)
+    warm(args.database, base / "cache", args.workers)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
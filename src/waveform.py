@@ -0,0 +1,60 @@
+import numpy as np
+
+# Peak pyramid: per-channel min / max / RMS at several block sizes (frames per entry).
+# Drawing picks the coarsest level that still has >= 1 entry per pixel, so cost is O(pixels) at any zoom.
+LEVELS = (256, 1024, 4096, 16384)
+
+
+class PeakPyramid:
+    def __init__(self, levels, frames):
+        self.levels = levels; self.frames = frames
+
+    @classmethod
+    def build(cls, data):
+        n = len(data) // LEVELS[0]; levels = {}
+        if n == 0: return cls({b: np.zeros((0, data.shape[1], 3), np.float16) for b in LEVELS}, len(data))
+        # Channel-major copy first: reductions over a contiguous last axis are ~10x faster than over interleaved frames
+        blk = np.ascontiguousarray(data[:n * LEVELS[0]].T).reshape(data.shape[1], n, LEVELS[0])
+        mn = blk.min(axis=2).T / 32768.0; mx = blk.max(axis=2).T / 32768.0
+        f = blk.astype(np.float32); ms = np.einsum("cij,cij->ic", f, f) / LEVELS[0] / 32768.0 ** 2
+        for b in LEVELS:
+            g = b // LEVELS[0]; m = len(mn) // g
+            lmn = mn[:m * g].reshape(m, g, -1).min(axis=1); lmx = mx[:m * g].reshape(m, g, -1).max(axis=1)
+            lrms = np.sqrt(ms[:m * g].reshape(m, g, -1).mean(axis=1))
+            levels[b] = np.stack([lmn, lmx, lrms], axis=-1).astype(np.float16)
+        return cls(levels, len(data))
+
+    def save(self, f):
+        np.savez(f, frames=np.int64(self.frames), **{f"l{b}": a for b, a in self.levels.items()})
+
+    @classmethod
+    def load(cls, f):
+        with np.load(f) as z: return cls({b: z[f"l{b}"] for b in LEVELS}, int(z["frames"]))
+
+    @property
+    def peak(self):
+        lvl = next((self.levels[b] for b in reversed(LEVELS) if len(self.levels[b])), None)
+        return float(np.abs(lvl[:, :, :2].astype(np.float32)).max()) if lvl is not None else 0.0
+
+    @property
+    def nbytes(self): return sum(a.nbytes for a in self.levels.values())
+
+    def columns(self, start, end, width):
+        # Returns (min, max, rms) per pixel for frames [start, end), channels folded together
+        width = max(1, int(width)); span = max(1, end - start); fpp = span / width
+        b = max([b for b in LEVELS if b <= fpp] or [LEVELS[0]]); lvl = self.levels[b]
+        if len(lvl) == 0: z = np.zeros(width, np.float32); return z, z, z
+        edges = np.clip((start + np.arange(width + 1) * fpp) // b, 0, len(lvl) - 1).astype(np.int64)
+        edges[1:] = np.maximum(edges[1:], edges[:-1] + 1); edges = np.minimum(edges, len(lvl) - 1)
+        lvl = lvl[edges[0]:edges[-1] + 1].astype(np.float32); edges -= edges[0]
+        mn = np.minimum.reduceat(lvl[:, :, 0].min(axis=1), edges[:-1]); mx = np.maximum.reduceat(lvl[:, :, 1].max(axis=1), edges[:-1])
+        rms = np.maximum.reduceat(lvl[:, :, 2].max(axis=1), edges[:-1])
+        past = (start + np.arange(width) * fpp) >= self.frames; mn[past] = mx[past] = rms[past] = 0
+        return mn, mx, rms
+
+
+def load_peaks(assets, track):
+    # Complete tracks with a source file are cached next to their PCM; a track still streaming is built on the fly
+    if track is None: return None
+    if track.path is None or not getattr(track, "complete", True): return PeakPyramid.build(track.data[:track.frames])
+    return assets.cached(track.path, "peaks", PeakPyramid.load, lambda: PeakPyramid.build(track.data[:track.frames]), PeakPyramid.save)